@@ -0,0 +1,110 @@
+"""Query budget of the cart and checkout paths.
+
+Counts the SQL statements GET /cart and GET /cart/total send for carts of
+different sizes, an empty cart and a user without a cart, and fails if any
+of them takes more than one. Then checks out carts of those sizes through
+POST /cart/checkout and POST /checkout and fails unless each path sends the
+same number of statements for every size. Uses a throwaway SQLite database.
+
+    python -m benchmarks.cart_query_budget
+"""
+import argparse
+import sys
+
+from sqlalchemy import event
+
+from benchmarks.common import bench_app, bench_store
+
+BUDGET = {'/cart': 1, '/cart/total': 1}
+CHECKOUTS = ['/cart/checkout', '/checkout']
+CHECKOUT_BODY = {'payment_method': 'COD', 'delivery_option': 'pickup'}
+
+def add_buyer(s, name, products, size):
+    # A user with a cart of size products, none for size None
+    from models.users import User
+    from models.cart import Cart
+    from models.cart_item import CartItem
+
+    user = User(username=name, email=f'{name.replace(" ", "-")}@bench.test', first_name='Bench', last_name='Buyer', password='x')
+    s.add(user)
+    s.flush()
+    if size is not None:
+        cart = Cart(user_id=user.id)
+        s.add(cart)
+        s.flush()
+        s.add_all([CartItem(cart_id=cart.id, product_id=product.id, quantity=2, price=product.price, user_id=user.id)
+                   for product in products[:size]])
+    return user.id
+
+def setup(sizes):
+    from connectors.mysql_connector import Session
+    from models.products import Products
+
+    app = bench_app('cart')
+
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        s = Session()
+        store = bench_store(s)
+        products = [Products(name=f'Item {i}', price='9.99', stock_quantity=10 ** 6, store_id=store.id)
+                    for i in range(max(sizes))]
+        s.add_all(products)
+        s.flush()
+
+        readers = {label: add_buyer(s, label, products, size)
+                   for label, size in [(f'{size} items', size) for size in sizes] + [('empty cart', 0), ('no cart', None)]}
+        # Checking out empties the cart, so every checkout gets its own buyer
+        buyers = {(url, size): add_buyer(s, f'{url} {size}', products, size) for url in CHECKOUTS for size in sizes}
+        s.commit()
+        tokens = {label: create_access_token(identity=str(user_id)) for label, user_id in readers.items()}
+        checkout_tokens = {key: create_access_token(identity=str(user_id)) for key, user_id in buyers.items()}
+        Session.remove()
+    return app, tokens, checkout_tokens
+
+def report(statements):
+    for statement in statements:
+        print('   ', ' '.join(statement.split())[:160])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    from connectors.mysql_connector import get_engine
+
+    app, tokens, checkout_tokens = setup(args.sizes)
+    client = app.test_client()
+    statements = []
+    event.listen(get_engine(), 'before_cursor_execute', lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    failed = False
+    for label, token in tokens.items():
+        for url, budget in BUDGET.items():
+            statements.clear()
+            response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+            ok = response.status_code == 200 and len(statements) <= budget
+            failed = failed or not ok
+            print(f"{url:15} {label:12} {response.status_code} {len(statements)} queries (budget {budget}) {'ok' if ok else 'FAIL'}")
+            if not ok:
+                report(statements)
+
+    for url in CHECKOUTS:
+        counts = {}
+        for size in args.sizes:
+            statements.clear()
+            response = client.post(url, json=CHECKOUT_BODY, headers={'Authorization': f'Bearer {checkout_tokens[url, size]}'})
+            counts[size] = len(statements)
+            ok = response.status_code == 200
+            failed = failed or not ok
+            print(f"{url:15} {size:>3} items    {response.status_code} {len(statements)} queries {'ok' if ok else 'FAIL'}")
+            if not ok:
+                print('   ', response.get_data(as_text=True)[:160])
+        if len(set(counts.values())) > 1:
+            failed = True
+            print(f"{url:15} FAIL: the number of queries grows with the cart")
+            report(statements)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Setup shared by the benchmarks: a throwaway SQLite app with local storage."""
+import os
+import tempfile
+
+def bench_config(name):
+    """Settings for an app in a fresh temporary directory, named after the benchmark.
+
+    Plain strings, so they also work as environment variables for a child
+    interpreter.
+    """
+    workdir = tempfile.mkdtemp(prefix=f'{name}-')
+    return {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, name + '.db')}",
+        'STORAGE_BACKEND': 'local',
+        'LOCAL_STORAGE_DIR': os.path.join(workdir, 'media'),
+        'UPLOAD_SPOOL_DIR': os.path.join(workdir, 'spool'),
+        # Also signs the JWTs, which need at least 32 bytes
+        'SECRET_KEY': 'bench' * 8,
+    }
+
+def bench_app(name, **overrides):
+    """create_app() over bench_config(name) and overrides, with its tables created."""
+    from index import create_app
+
+    app = create_app(dict(bench_config(name), **overrides))
+    app.test_cli_runner().invoke(args=['create-tables'])
+    return app
+
+def bench_store(session):
+    """Add the store the benchmark products belong to."""
+    from models.stores import Stores
+
+    store = Stores(seller_full_name='Bench', username='bench', email='bench@bench.test', store_name='Bench',
+                   description='', bank_account='1', contact_number='1', address='a', city='c',
+                   state='s', zip_code='z', image_url='', password_hash='x')
+    session.add(store)
+    session.flush()
+    return store
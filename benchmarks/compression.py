@@ -0,0 +1,119 @@
+"""Response compression: CPU cost against bytes saved on real endpoints.
+
+Fills a throwaway SQLite database with products and orders, fetches the
+uncompressed bodies of the big read endpoints through the app, then
+compresses each one with gzip and brotli at a few levels, the same way the
+after_request hook does (whole body, or chunk by chunk for streams).
+
+    python -m benchmarks.compression --products 20000 --orders 500
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import bench_app, bench_store
+
+WORDS = ('cake chocolate banana bread cheese spicy chicken rice noodle soup fresh '
+         'homemade crispy sweet sour beef satay coconut pandan mango tea coffee '
+         'bandung jakarta bali surabaya medan frozen family pack large small').split()
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def setup(args):
+    from connectors.mysql_connector import Session
+    from models.users import User
+    from models.products import Products
+    from services.checkout import place_order
+
+    app = bench_app('compression')
+
+    rng = random.Random(1)
+    with app.app_context():
+        s = Session()
+        store = bench_store(s)
+        user = User(username='bench', email='buyer@bench.test', first_name='Bench', last_name='Buyer', password='x')
+        s.add(user)
+        s.flush()
+        s.connection().execute(Products.__table__.insert(), [{
+            'name': sentence(rng, 3).title(),
+            'description': sentence(rng, 12),
+            'price': round(rng.uniform(1, 200), 2),
+            'stock_quantity': 10 ** 6,
+            'image_url': f'https://storage.googleapis.com/bench/{rng.getrandbits(64):016x}.jpg',
+            'location': rng.choice(WORDS).title(),
+            'featured': rng.random() < 0.01,
+            'store_id': store.id,
+        } for _ in range(args.products)])
+        s.commit()
+        for _ in range(args.orders):
+            lines = [{'product_id': rng.randint(1, args.products), 'quantity': rng.randint(1, 3),
+                      'price': rng.uniform(1, 200)} for _ in range(3)]
+            place_order(s, user.id, lines, payment_method='COD', delivery_option='pickup')
+        user_id = user.id
+        Session.remove()
+
+        from flask_jwt_extended import create_access_token
+        token = create_access_token(identity=str(user_id))
+    return app, {'Authorization': f'Bearer {token}'}
+
+def fetch(client, url, headers):
+    # Identity bodies, kept in the chunks the app produced them in
+    response = client.get(url, headers=dict(headers, **{'Accept-Encoding': 'identity'}), buffered=False)
+    assert response.status_code == 200, response.status_code
+    chunks = [chunk for chunk in response.response if chunk]
+    response.close()
+    return chunks
+
+def measure(chunks, streamed, encoding, level, repeat):
+    from services.compression import compress_body, compress_chunks
+
+    data = b''.join(chunks)
+    started = time.process_time()
+    for _ in range(repeat):
+        if streamed:
+            size = sum(len(part) for part in compress_chunks(iter(chunks), encoding, level))
+        else:
+            size = len(compress_body(data, encoding, level))
+    return size, (time.process_time() - started) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from services.compression import brotli
+
+    app, auth = setup(args)
+    client = app.test_client()
+    endpoints = [
+        # url, headers, streamed by the app
+        ('/products?stream=1', {}, True),
+        ('/products?limit=100', {}, False),
+        ('/search?keyword=cake&limit=1000', {}, False),
+        ('/orders/history?limit=100', auth, False),
+        ('/order?stream=1', auth, True),
+    ]
+    codecs = [('gzip', 1), ('gzip', 6), ('gzip', 9)]
+    if brotli is not None:
+        codecs += [('br', 1), ('br', 4), ('br', 11)]
+    else:
+        print("brotli is not installed, gzip only")
+
+    print(f"{args.products} products, {args.orders} orders")
+    print(f"{'endpoint':34} {'codec':8} {'bytes':>10} {'ratio':>6} {'saved':>10} {'cpu ms':>8} {'MB/s':>7} {'KB saved/ms':>11}")
+    for url, headers, streamed in endpoints:
+        chunks = fetch(client, url, headers)
+        plain = sum(len(chunk) for chunk in chunks)
+        label = url + (' (stream)' if streamed else '')
+        print(f"{label:34} {'identity':8} {plain:>10}")
+        for encoding, level in codecs:
+            size, seconds = measure(chunks, streamed, encoding, level, args.repeat)
+            saved = plain - size
+            print(f"{'':34} {encoding + ':' + str(level):8} {size:>10} {plain / size:>6.1f} {saved:>10} "
+                  f"{seconds * 1000:>8.2f} {plain / seconds / 1e6:>7.1f} {saved / 1024 / (seconds * 1000):>11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Checks that forked workers never share the parent's database connections.
+
+Builds the app the way gunicorn's preload does, uses the pool in the parent,
+then forks workers that each run queries on several threads. Every pooled
+connection records the pid that opened it; a worker that gets one opened by
+another process fails the check.
+
+    python -m benchmarks.forked_workers --workers 4 --threads 4
+
+Uses a throwaway SQLite file unless --db-url points at a scratch database.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from sqlalchemy import event, text
+
+def connections_in_use(threads):
+    from connectors.mysql_connector import Session
+
+    owners = []
+    lock = threading.Lock()
+
+    def query():
+        s = Session()
+        try:
+            s.execute(text('SELECT 1'))
+            with lock:
+                owners.append(s.connection().connection._connection_record.info['pid'])
+        finally:
+            Session.remove()
+
+    workers = [threading.Thread(target=query) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return owners
+
+def worker(threads, results):
+    results.put((os.getpid(), connections_in_use(threads)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db-url')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    from index import create_app
+    from connectors.mysql_connector import get_engine
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'fork.db')}"
+    create_app({'DATABASE_URL': db_url, 'STORAGE_BACKEND': 'local'})
+
+    @event.listens_for(get_engine(), 'connect')
+    def remember_owner(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    # Leave connections checked in to the parent's pool, as a preloaded app would
+    parent_owners = connections_in_use(args.threads)
+    print(f"parent {os.getpid()}: {len(parent_owners)} queries")
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(args.threads, results)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    failed = False
+    for pid, owners in reports:
+        shared = [owner for owner in owners if owner != pid]
+        failed = failed or bool(shared) or len(owners) != args.threads
+        print(f"worker {pid}: {len(owners)} queries, {len(shared)} on inherited connections "
+              f"{'SHARED' if shared else 'ok'}")
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""JSON encoding: Flask's stdlib provider against the orjson provider.
+
+Serializes product list and order history payloads shaped like the real
+endpoints (Decimal prices, datetimes, nested order items, query rows) with
+both providers, checks that they produce the same JSON, and reports
+payloads and MB per second. Needs no database.
+
+    python -m benchmarks.json_encoding --products 1000 --orders 100
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+def product(rng, product_id):
+    return {
+        'id': product_id,
+        'name': f'Product {product_id}',
+        'description': 'homemade chocolate cake with pandan and coconut',
+        'price': Decimal(rng.randint(100, 20000)) / 100,
+        'stock_quantity': rng.randint(0, 500),
+        'image_url': f'https://storage.googleapis.com/bench/{rng.getrandbits(64):016x}.jpg',
+        'location': 'Bandung',
+        'featured': rng.random() < 0.1,
+        'store_id': rng.randint(1, 50),
+        'rating': {'count': 3, 'average': 4.33, 'histogram': {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1}},
+    }
+
+def order(rng, order_id):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randint(0, 500000))
+    items = [{
+        'id': order_id * 10 + line,
+        'order_id': order_id,
+        'product_id': rng.randint(1, 10000),
+        'product_name': f'Product {line}',
+        'quantity': rng.randint(1, 5),
+        'price': Decimal(rng.randint(100, 20000)) / 100,
+    } for line in range(rng.randint(1, 6))]
+    return {
+        'id': order_id,
+        'user_id': 1,
+        'total_price': sum(item['price'] * item['quantity'] for item in items),
+        'payment_method': 'COD',
+        'delivery_option': 'pickup',
+        'status': 'pending',
+        'review': None,
+        'created_at': created,
+        'updated_at': created,
+        'order_items': items,
+    }
+
+def rows(count):
+    # Column query results, as the projection read path returns them
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        values = ' UNION ALL '.join(f"SELECT {i} AS id, 'Product {i}' AS name, {i % 500} AS stock_quantity" for i in range(count))
+        return connection.execute(text(values)).all()
+
+def throughput(encode, payload, seconds):
+    size = len(encode(payload))
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        encode(payload)
+        calls += 1
+    elapsed = time.perf_counter() - started
+    return calls / elapsed, size * calls / elapsed / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=2)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from services.json_provider import FastJSONProvider, orjson
+
+    if orjson is None:
+        print("orjson is not installed, both providers use the stdlib encoder")
+
+    rng = random.Random(1)
+    payloads = [
+        ('products page', {'products': [product(rng, i) for i in range(100)], 'next': 'eyJpZCI6MTAwfQ'}),
+        ('product catalog', [product(rng, i) for i in range(args.products)]),
+        ('order history', {'orders': [order(rng, i) for i in range(args.orders)], 'next': None}),
+        ('single product', {'product': product(rng, 1)}),
+    ]
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+
+    print(f"{'payload':16} {'provider':8} {'bytes':>9} {'calls/s':>10} {'MB/s':>8} {'speedup':>8}")
+    for name, payload in payloads:
+        with app.app_context():
+            expected = stdlib.response(payload).get_data()
+            actual = fast.response(payload).get_data()
+            assert json.loads(expected) == json.loads(actual), name
+
+            base_calls, base_mb = throughput(lambda obj: stdlib.response(obj).get_data(), payload, args.seconds)
+            calls, mb = throughput(lambda obj: fast.response(obj).get_data(), payload, args.seconds)
+        print(f"{name:16} {'stdlib':8} {len(expected):>9} {base_calls:>10.0f} {base_mb:>8.1f}")
+        print(f"{'':16} {'fast':8} {len(actual):>9} {calls:>10.0f} {mb:>8.1f} {calls / base_calls:>7.1f}x")
+
+    # The stdlib provider cannot encode rows at all
+    with app.app_context():
+        result = rows(500)
+        calls, mb = throughput(lambda obj: fast.response(obj).get_data(), {'products': result}, args.seconds)
+    print(f"{'500 query rows':16} {'fast':8} {len(fast.dumps({'products': result})):>9} {calls:>10.0f} {mb:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Login burst: bcrypt on the request thread vs in the password process pool.
+
+Fires concurrent /login requests at the app while another thread keeps
+hitting a cheap endpoint, and reports login throughput and how long the
+cheap requests took meanwhile. Uses a throwaway SQLite database.
+
+    python -m benchmarks.login_burst --threads 16 --logins 10 --rounds 12
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from benchmarks.common import bench_app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=10, help='logins per thread')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt work factor')
+    # Not PASSWORD_WORKERS: that splits the CPUs between the web workers, and
+    # this process is the only one hashing
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='hashing processes in the pool')
+    args = parser.parse_args()
+
+    from config import settings
+    from connectors.mysql_connector import Session
+    from models.users import User
+    from services.passwords import passwords
+
+    # Every thread logs into the same account, so the auth rate limits and the
+    # hashing cap would turn most of the burst away; this measures hashing,
+    # not admission
+    unlimited = 10 ** 9
+    app = bench_app('login', BCRYPT_ROUNDS=args.rounds, AUTH_IP_RATE=unlimited, AUTH_IP_BURST=unlimited,
+                    AUTH_ACCOUNT_RATE=unlimited, AUTH_ACCOUNT_BURST=unlimited, PASSWORD_MAX_PENDING=unlimited)
+
+    settings.PASSWORD_WORKERS = 0
+    s = Session()
+    user = User(username='bench', email='bench@bench.test', first_name='Bench', last_name='User')
+    user.set_password('secret')
+    hashed = user.password
+    s.add(user)
+    s.commit()
+    Session.remove()
+
+    print(f"{args.threads} threads x {args.logins} logins, bcrypt rounds {args.rounds}")
+    for label, workers in [('request thread', 0), (f'pool of {args.workers}', args.workers)]:
+        settings.PASSWORD_WORKERS = workers
+        if workers:
+            # Start the worker processes before timing
+            passwords.verify('secret', hashed)
+
+        done = threading.Event()
+        pings = []
+
+        def ping():
+            client = app.test_client()
+            while not done.is_set():
+                started = time.perf_counter()
+                client.get('/')
+                pings.append(time.perf_counter() - started)
+                time.sleep(0.005)
+
+        def login():
+            client = app.test_client()
+            for _ in range(args.logins):
+                response = client.post('/login', json={'email': 'bench@bench.test', 'password': 'secret'})
+                assert response.status_code == 200, response.get_data(as_text=True)
+
+        pinger = threading.Thread(target=ping)
+        pinger.start()
+        logins = [threading.Thread(target=login) for _ in range(args.threads)]
+        started = time.perf_counter()
+        for thread in logins:
+            thread.start()
+        for thread in logins:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        pinger.join()
+
+        pings.sort()
+        p99 = pings[int(len(pings) * 0.99) - 1] if pings else 0
+        print(f"{label:>16}: {args.threads * args.logins / elapsed:7.1f} logins/s  "
+              f"other requests median {statistics.median(pings) * 1000:6.1f} ms, p99 {p99 * 1000:6.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Listing reads: full ORM entities against column rows.
+
+Loads every product of a throwaway SQLite catalog the way the listing
+endpoints used to (Products entities with their rating joined) and the way
+they do now (services/product_reads.py column rows), and reports rows per
+second for the load alone and for load plus JSON, and the memory held per
+loaded row.
+
+    python -m benchmarks.projection_reads --products 100000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import bench_app, bench_store
+
+def setup(args):
+    from connectors.mysql_connector import Session
+    from models.products import Products
+    from models.ratings import ProductRating
+
+    app = bench_app('projection')
+
+    rng = random.Random(1)
+    with app.app_context():
+        s = Session()
+        store = bench_store(s)
+        s.connection().execute(Products.__table__.insert(), [{
+            'name': f'Product {i}',
+            'description': 'homemade chocolate cake with pandan and coconut ' * 3,
+            'price': round(rng.uniform(1, 200), 2),
+            'stock_quantity': rng.randint(0, 500),
+            'image_url': f'https://storage.googleapis.com/bench/{rng.getrandbits(64):016x}.jpg',
+            'location': 'Bandung',
+            'featured': False,
+            'store_id': store.id,
+        } for i in range(args.products)])
+        # A third of the products have been rated
+        s.connection().execute(ProductRating.__table__.insert(), [{
+            'product_id': product_id, 'count': 3, 'total': 12,
+            'stars_1': 0, 'stars_2': 0, 'stars_3': 1, 'stars_4': 1, 'stars_5': 1,
+        } for product_id in range(1, args.products + 1, 3)])
+        s.commit()
+        Session.remove()
+    return app
+
+def entity_item(p):
+    # GET /products before the column read path
+    from models.ratings import rating_summary
+    return {
+        "id": p.id,
+        "name": p.name,
+        "price": p.price,
+        "stock": p.stock_quantity,
+        "store_id": p.store_id,
+        "image_url": p.image_url,
+        "location": p.location,
+        "rating": rating_summary(p.rating)
+    }
+
+def strategies():
+    from sqlalchemy.orm import joinedload
+    from models.products import Products
+    from services.product_reads import OVERVIEW_COLUMNS, catalog_rows, list_item, product_rows
+
+    return [
+        # name, query, item serializer
+        ('entities + rating', lambda s: s.query(Products).options(joinedload(Products.rating)).order_by(Products.id), entity_item),
+        ('rows + rating', lambda s: catalog_rows(s).order_by(Products.id), list_item),
+        ('entities, 4 columns', lambda s: s.query(Products).order_by(Products.id),
+         lambda p: {"id": p.id, "name": p.name, "price": p.price, "stock_quantity": p.stock_quantity}),
+        ('rows, 4 columns', lambda s: product_rows(s, OVERVIEW_COLUMNS).order_by(Products.id), lambda row: row),
+    ]
+
+def run(app, query, serialize, serialized=False, trace=False):
+    # Times are taken without tracemalloc, which slows allocation down a lot
+    from connectors.mysql_connector import Session
+
+    with app.app_context():
+        s = Session()
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        loaded = query(s).all()
+        if serialized:
+            app.json.response([serialize(item) for item in loaded]).get_data()
+        elapsed = time.perf_counter() - started
+        held, peak = tracemalloc.get_traced_memory() if trace else (0, 0)
+        tracemalloc.stop()
+        count = len(loaded)
+        del loaded
+        Session.remove()
+    return count, elapsed, held, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    app = setup(args)
+    print(f"{args.products} products, best of {args.runs} runs")
+    print(f"{'read path':22} {'load rows/s':>12} {'+json rows/s':>13} {'held B/row':>11} {'peak B/row':>11}")
+    for name, query, serialize in strategies():
+        loads = [run(app, query, serialize) for _ in range(args.runs)]
+        dumps = [run(app, query, serialize, serialized=True) for _ in range(args.runs)]
+        count, _, held, peak = run(app, query, serialize, trace=True)
+        load_rate = count / min(result[1] for result in loads)
+        dump_rate = count / min(result[1] for result in dumps)
+        held, peak = held / count, peak / count
+        print(f"{name:22} {load_rate:>12.0f} {dump_rate:>13.0f} {held:>11.0f} {peak:>11.0f}")
+
+if __name__ == '__main__':
+    main()
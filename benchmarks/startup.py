@@ -0,0 +1,67 @@
+"""Cold-start cost of a worker: import time, create_app() and first requests.
+
+Every run happens in a fresh interpreter so nothing is cached between runs.
+Uses a throwaway SQLite database and the local storage backend, so it
+needs no MySQL or GCS.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import bench_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, time
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+app = index.create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/')
+first_request = time.perf_counter()
+client.get('/products')
+first_db_request = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": first_request - created,
+    "first_db_request": first_db_request - first_request,
+    "total": first_db_request - started,
+}))
+'''
+
+SETUP = r'''
+import index
+app = index.create_app()
+app.test_cli_runner().invoke(args=['create-tables'])
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, **bench_config('startup'))
+    subprocess.run([sys.executable, '-c', SETUP], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    samples = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print(f"median of {args.runs} cold starts (ms)")
+    for key in samples[0]:
+        values = [sample[key] * 1000 for sample in samples]
+        print(f"{key:>18}: {statistics.median(values):8.1f}   (min {min(values):.1f}, max {max(values):.1f})")
+
+if __name__ == '__main__':
+    main()
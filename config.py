@@ -1,6 +1,133 @@
 import os
+import tempfile
+
+def database_url():
+    url = os.getenv('DATABASE_URL')
+    if url:
+        return url
+    username = os.getenv("DB_USERNAME")
+    password = os.getenv("DB_PASSWORD")
+    host = os.getenv("DB_HOST")
+    database = os.getenv("DB_DATABASE")
+    return f'mysql+mysqlconnector://{username}:{password}@{host}/{database}'
 
 class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY')
     GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME')
     GCS_CREDENTIALS = os.getenv('GCS_CREDENTIALS')
-    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
+
+    # DATABASE_URL wins over the DB_* parts, e.g. sqlite:///localbites.db offline
+    DATABASE_URL = database_url()
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+    # Served by gunicorn (see gunicorn.conf.py)
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS') or (os.cpu_count() or 1) * 2 + 1)
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 30))
+
+    # 'gcs' or 'local'
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'gcs')
+    LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', 'media')
+    LOCAL_STORAGE_URL = os.getenv('LOCAL_STORAGE_URL', '/media')
+
+    # Service settings. Controllers read them from current_app.config, the
+    # services from config.settings below, so both follow create_app().
+
+    # Page sizes of the listing endpoints, and rows per chunk when streaming
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 20))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+
+    # 'atomic', 'pessimistic' or 'optimistic', see services/inventory.py
+    STOCK_STRATEGY = os.getenv('STOCK_STRATEGY', 'atomic')
+    STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', 600))
+    STOCK_RETRIES = int(os.getenv('STOCK_RETRIES', 5))
+
+    # Cost of new hashes. Raising it upgrades existing hashes as users log in.
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    # Hashing processes per web worker; 0 hashes on the request thread (handy
+    # for scripts and local runs). Every gunicorn worker has its own pool, so
+    # the default splits the CPUs between them instead of giving each one a
+    # process per CPU, which would run WEB_WORKERS x CPUs hashes at once.
+    PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS') or max(1, (os.cpu_count() or 1) // WEB_WORKERS))
+    # Hashes running or waiting at once in a worker, with or without a pool.
+    # This is the cap on hash work; past it auth requests get an immediate 429.
+    PASSWORD_MAX_PENDING = int(os.getenv('PASSWORD_MAX_PENDING', 32))
+
+    # Sustained attempts per second and burst size, per client IP and per account
+    AUTH_IP_RATE = float(os.getenv('AUTH_IP_RATE', 1))
+    AUTH_IP_BURST = int(os.getenv('AUTH_IP_BURST', 20))
+    AUTH_ACCOUNT_RATE = float(os.getenv('AUTH_ACCOUNT_RATE', 0.1))
+    AUTH_ACCOUNT_BURST = int(os.getenv('AUTH_ACCOUNT_BURST', 5))
+    # Load balancers in front of the app, as addresses or networks separated by
+    # commas. X-Forwarded-For is only believed when a trusted proxy sent it;
+    # without any, every request is limited by the address that connected.
+    AUTH_TRUSTED_PROXIES = os.getenv('AUTH_TRUSTED_PROXIES', '')
+    # Buckets kept in memory; the least recently used are dropped past this
+    AUTH_MAX_TRACKED = int(os.getenv('AUTH_MAX_TRACKED', 100000))
+
+    # How long a user or store id that was seen in the database is trusted
+    # without checking again, and how many ids are remembered per worker
+    PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 300))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 10000))
+    # Accounts kept loaded for Flask-Login's current_user
+    LOGIN_CACHE_SIZE = int(os.getenv('LOGIN_CACHE_SIZE', 1024))
+
+    # Rows per INSERT when importing products, and errors reported per import
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+    # Patches per bulk update request, and products per UPDATE ... CASE statement
+    BULK_UPDATE_MAX = int(os.getenv('BULK_UPDATE_MAX', 5000))
+    BULK_UPDATE_CHUNK = int(os.getenv('BULK_UPDATE_CHUNK', 500))
+
+    # Default window and top products of the store sales analytics
+    ANALYTICS_DAYS = int(os.getenv('ANALYTICS_DAYS', 30))
+    ANALYTICS_TOP_PRODUCTS = int(os.getenv('ANALYTICS_TOP_PRODUCTS', 10))
+
+    # Bodies smaller than this go out as they are; compressing them costs more
+    # than the bytes it saves
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    # gzip level 1-9 and brotli quality 0-11. Brotli's default of 11 is meant
+    # for static files and is far too slow per request.
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    # Encodings the server offers, preferred first
+    COMPRESS_ENCODINGS = [name.strip() for name in os.getenv('COMPRESS_ENCODINGS', 'br,gzip').split(',') if name.strip()]
+
+    SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 20))
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+    # Other workers keep their own copy of the index, so rebuild from the
+    # database now and then to pick up their writes. 0 disables it.
+    SEARCH_INDEX_REFRESH = int(os.getenv('SEARCH_INDEX_REFRESH', 300))
+
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+    UPLOAD_MAX_PENDING = int(os.getenv('UPLOAD_MAX_PENDING', 64))
+    UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', 3))
+    UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'localbites-uploads')
+    # Seconds an upload's status can be polled after its last change; older
+    # status files (and anything an interrupted upload left behind) are removed
+    UPLOAD_STATUS_TTL = int(os.getenv('UPLOAD_STATUS_TTL', 3600))
+
+class Settings:
+    """The settings of the app being served, for code that also runs outside
+    a request (services called from scripts, background threads, singletons).
+
+    Starts out as Config; create_app() loads the app's config over it.
+    Services read ``settings.NAME`` each time they use a value, so nothing
+    keeps a copy from before create_app().
+    """
+
+    def __init__(self, config):
+        self.load(config)
+
+    def load(self, config):
+        for name, value in config.items():
+            if name.isupper():
+                setattr(self, name, value)
+
+settings = Settings(vars(Config))
@@ -1,14 +1,113 @@
 from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session, Session as OrmSession
+from sqlalchemy.pool import QueuePool
 import os
+import threading
 
-username = os.getenv ("DB_USERNAME")
-password = os.getenv ("DB_PASSWORD")
-host = os.getenv ("DB_HOST")
-database = os.getenv ("DB_DATABASE")
+# Filled in by init_app() from the app config. Nothing connects (or even
+# imports the database driver) until the first query asks for the engine.
+settings = {}
+engine = None
+_engine_lock = threading.Lock()
 
-# Connect to Database
-print("Connecting to MySQL Database")
-engine = create_engine(f'mysql+mysqlconnector://{username}:{password}@{host}/{database}')
+def configure(url, pool_size=10, max_overflow=20, pool_timeout=30, pool_recycle=1800):
+    global engine
+    new_settings = dict(
+        url=url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle
+    )
+    with _engine_lock:
+        if new_settings != settings and engine is not None:
+            # Reconfigured (e.g. a second app with another database)
+            Session.remove()
+            engine.dispose()
+            engine = None
+        settings.clear()
+        settings.update(new_settings)
 
-connection = engine.connect()
-print("success connecting to MySQL Database")
\ No newline at end of file
+def build_engine():
+    url = settings.get('url')
+    if not url:
+        raise RuntimeError("Database is not configured, call init_app() first")
+
+    if url.startswith('sqlite'):
+        # Offline runs; SQLite picks its own pool. Prices are Decimals, which
+        # MySQL takes as is but the sqlite3 driver has to be taught about.
+        import sqlite3
+        from decimal import Decimal
+        sqlite3.register_adapter(Decimal, str)
+        return create_engine(url, connect_args={'check_same_thread': False})
+
+    print("Connecting to MySQL Database")
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=settings['pool_size'],
+        max_overflow=settings['max_overflow'],
+        pool_timeout=settings['pool_timeout'],
+        pool_recycle=settings['pool_recycle'],
+        pool_pre_ping=True
+    )
+
+def get_engine():
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                engine = build_engine()
+    return engine
+
+class LazySession(OrmSession):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return get_engine()
+
+# One session factory for the whole app. Each request (thread) gets its own
+# session from the registry and init_app() removes it when the request ends.
+Session = scoped_session(sessionmaker(class_=LazySession))
+
+def after_fork():
+    """Give a forked worker its own pool.
+
+    A worker forked from a preloaded app inherits the parent's pooled
+    connections, whose sockets the parent and every sibling still hold.
+    Drop them without closing (closing would end the parent's sessions too)
+    and let the worker open fresh connections on first use.
+    """
+    global _engine_lock
+    _engine_lock = threading.Lock()  # May have been held by another thread at fork time
+    Session.registry.clear()
+    if engine is not None:
+        engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
+
+def init_app(app):
+    configure(
+        app.config['DATABASE_URL'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE']
+    )
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        Session.remove()
+
+def pool_status():
+    if engine is None:
+        return {"connected": False}
+    pool = engine.pool
+    status = {"connected": True, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update(
+            pool_size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow()
+        )
+    return status
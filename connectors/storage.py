@@ -0,0 +1,105 @@
+import os
+import shutil
+import threading
+import time
+
+# Blob names are content hashes, so what is behind a URL never changes
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class LocalStorage:
+    """Keeps uploaded files in a local directory, for development and tests."""
+
+    name = 'local'
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+        os.makedirs(root, exist_ok=True)
+
+    def upload(self, path, name, content_type=None):
+        target = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + '.part'
+        shutil.copyfile(path, tmp)
+        if content_type:
+            with open(target + '.type', 'w') as f:
+                f.write(content_type)
+        os.replace(tmp, target)
+        return self.public_url(name)
+
+    def content_type(self, name):
+        try:
+            with open(os.path.join(self.root, name + '.type')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def public_url(self, name):
+        return f"{self.base_url}/{name}"
+
+    def status(self):
+        return {"backend": self.name, "client_ready": True, "init_seconds": 0}
+
+class GCSStorage:
+    """Uploads files to a Google Cloud Storage bucket.
+
+    The google-cloud import and the client are only created on first use and
+    then shared by every request and upload thread, so workers boot without
+    touching GCS and can start without credentials.
+    """
+
+    name = 'gcs'
+
+    def __init__(self, bucket_name, credentials=None):
+        self.bucket_name = bucket_name
+        self.credentials = credentials
+        self.init_seconds = None
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    started = time.perf_counter()
+                    from google.cloud import storage
+                    if self.credentials:
+                        client = storage.Client.from_service_account_json(self.credentials)
+                    else:
+                        client = storage.Client()
+                    # bucket() only builds a reference, unlike get_bucket() which
+                    # makes a request to check that the bucket exists
+                    self._bucket = client.bucket(self.bucket_name)
+                    self.init_seconds = time.perf_counter() - started
+                    print(f"GCS client ready in {self.init_seconds * 1000:.1f} ms")
+        return self._bucket
+
+    def upload(self, path, name, content_type=None):
+        blob = self.bucket.blob(name)
+        blob.cache_control = CACHE_CONTROL
+        blob.upload_from_filename(path, content_type=content_type)
+        return self.public_url(name)
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def public_url(self, name):
+        return f"https://storage.googleapis.com/{self.bucket_name}/{name}"
+
+    def status(self):
+        return {"backend": self.name, "client_ready": self._bucket is not None, "init_seconds": self.init_seconds}
+
+def create_storage(config):
+    backend = config.get('STORAGE_BACKEND', 'gcs')
+    if not isinstance(backend, str):
+        # An already built backend, e.g. injected by tests
+        return backend
+    if backend == 'local':
+        return LocalStorage(config['LOCAL_STORAGE_DIR'], config['LOCAL_STORAGE_URL'])
+    if backend == 'gcs':
+        return GCSStorage(config['GCS_BUCKET_NAME'], config.get('GCS_CREDENTIALS'))
+    raise ValueError(f"Unknown storage backend: {backend}")
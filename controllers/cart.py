@@ -1,24 +1,66 @@
 from flask import Blueprint, request, jsonify
-from connectors.mysql_connector import connection, engine
-from sqlalchemy.orm import sessionmaker
+from connectors.mysql_connector import Session
 from models.users import User
 from models.products import Products
 from models.cart import Cart
 from models.order import Order
-from models.order_item import OrderItem
 from models.cart_item import CartItem
 from models.feedback import Feedback
+from services.checkout import place_order, InsufficientStock, StockConflict
+from services.inventory import reserve, release_reservations, run_with_retries
+from services.ratings import record_rating
+from models.ratings import STARS
 
+from sqlalchemy import func, case
 from sqlalchemy.exc import SQLAlchemyError
 from flask_login import current_user, login_required
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 cart_routes = Blueprint('cart_routes', __name__)
 
+def load_cart_lines(session, user_id):
+    # User, cart, items and products in a single round trip. The outer joins
+    # keep one row for an existing user even when the cart is missing or
+    # empty, so an empty result means the user does not exist.
+    rows = session.query(
+        Cart.id.label('cart_id'),
+        CartItem.id,
+        CartItem.product_id,
+        CartItem.quantity,
+        Products.id.label('found_product_id'),
+        Products.name.label('product_name'),
+        Products.price,
+        Products.image_url,
+        (CartItem.quantity * Products.price).label('total_price')
+    ).select_from(User) \
+        .outerjoin(Cart, Cart.user_id == User.id) \
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id) \
+        .outerjoin(Products, Products.id == CartItem.product_id) \
+        .filter(User.id == user_id) \
+        .order_by(Cart.id, CartItem.id) \
+        .all()
+
+    if not rows:
+        return None
+
+    cart_id = rows[0].cart_id
+    lines = [row for row in rows if row.cart_id == cart_id and row.id is not None]
+    return cart_id, lines
+
+def checkout_fields(data):
+    # The order columns a checkout body has to give; returns them or an error
+    if not data or 'payment_method' not in data:
+        return None, "Payment method is required"
+    if data['payment_method'] not in ['bank_transfer', 'COD']:
+        return None, "Invalid payment method"
+    delivery_option = data.get('delivery_option')
+    if not isinstance(delivery_option, str) or not delivery_option.strip() or len(delivery_option) > 50:
+        return None, "Delivery option is required"
+    return {"payment_method": data['payment_method'], "delivery_option": delivery_option.strip()}, None
+
 @cart_routes.route('/cart/add', methods=['POST'])
 @jwt_required()
 def add_product_to_cart():
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
@@ -87,50 +129,40 @@ def add_product_to_cart():
 @cart_routes.route('/cart', methods=['GET'])
 @jwt_required()
 def view_cart():
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
         # Get the user ID from the JWT
         user_id = get_jwt_identity()
 
-        # Ensure the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
+        cart = load_cart_lines(session, user_id)
+        if cart is None:
             return jsonify({"message": "User not found"}), 404
 
-        # Retrieve the user's cart
-        cart = session.query(Cart).filter_by(user_id=user_id).first()
-        if not cart:
+        cart_id, lines = cart
+        if cart_id is None:
             return jsonify({"cart_items": []}), 200  # Empty cart response
 
-        # Retrieve items in the cart
-        cart_items = session.query(CartItem).filter_by(cart_id=cart.id).all()
         items = []
-
-        # Loop through each cart item and get the related product information
-        for item in cart_items:
-            product = session.query(Products).filter_by(id=item.product_id).first()
-            if product:
-                items.append({
-                    "id": item.id,
-                    "product_id": item.product_id,
-                    "product_name": product.name,
-                    "quantity": item.quantity,
-                    "price": product.price,
-                    "total_price": item.quantity * product.price,
-                    "image_url": product.image_url
-                })
-            else:
+        for line in lines:
+            if line.found_product_id is None:
                 # If a product related to the cart item is not found
-                return jsonify({"message": f"Product with id {item.product_id} not found"}), 404
+                return jsonify({"message": f"Product with id {line.product_id} not found"}), 404
+
+            items.append({
+                "id": line.id,
+                "product_id": line.product_id,
+                "product_name": line.product_name,
+                "quantity": line.quantity,
+                "price": line.price,
+                "total_price": line.total_price,
+                "image_url": line.image_url
+            })
 
-        session.commit()
         return jsonify({"cart_items": items}), 200
 
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"Querying product with id: {item.product_id}")
         return jsonify({"message": "Failed to retrieve cart items", "error": str(e)}), 500
     finally:
         session.close()
@@ -138,7 +170,6 @@ def view_cart():
 @cart_routes.route('/cart/<int:product_id>', methods=['PUT'])
 @jwt_required()
 def update_cart_quantity(product_id):
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
@@ -172,7 +203,6 @@ def update_cart_quantity(product_id):
 @cart_routes.route('/cart/<int:product_id>', methods=['DELETE'])
 @jwt_required()
 def remove_cart_item(product_id):
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
@@ -200,7 +230,6 @@ def remove_cart_item(product_id):
 @cart_routes.route('/cart/clear', methods=['DELETE'])
 @jwt_required()
 def clear_cart():
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
@@ -224,36 +253,37 @@ def clear_cart():
 @cart_routes.route('/cart/total', methods=['GET'])
 @jwt_required()
 def get_cart_total():
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
         # Get the user ID from the JWT
         user_id = get_jwt_identity()
 
-        # Ensure the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
+        # Spot missing products and sum the total in SQL
+        result = session.query(
+            Cart.id,
+            func.min(case((Products.id.is_(None), CartItem.product_id))).label('missing_product_id'),
+            func.coalesce(func.sum(CartItem.quantity * Products.price), 0).label('total_price')
+        ).select_from(User) \
+            .outerjoin(Cart, Cart.user_id == User.id) \
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id) \
+            .outerjoin(Products, Products.id == CartItem.product_id) \
+            .filter(User.id == user_id) \
+            .group_by(Cart.id) \
+            .order_by(Cart.id) \
+            .first()
+
+        if result is None:
             return jsonify({"message": "User not found"}), 404
 
-        # Retrieve the user's cart
-        cart = session.query(Cart).filter_by(user_id=user_id).first()
-        if not cart:
+        if result.id is None:
             return jsonify({"total_price": 0}), 200  # Empty cart response
 
-        # Retrieve items in the cart and calculate the total price
-        cart_items = session.query(CartItem).filter_by(cart_id=cart.id).all()
-        total_price = 0
-
-        for item in cart_items:
-            product = session.query(Products).filter_by(id=item.product_id).first()
-            if product:
-                total_price += item.quantity * product.price
-            else:
-                # If a product related to the cart item is not found
-                return jsonify({"message": f"Product with id {item.product_id} not found"}), 404
+        if result.missing_product_id is not None:
+            # If a product related to the cart item is not found
+            return jsonify({"message": f"Product with id {result.missing_product_id} not found"}), 404
 
-        session.commit()
+        total_price = result.total_price
         return jsonify({"total_price": total_price}), 200
 
     except SQLAlchemyError as e:
@@ -265,85 +295,117 @@ def get_cart_total():
 @cart_routes.route('/cart/checkout', methods=['POST'])
 @jwt_required()
 def checkout_cart():
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
         # Get the user ID from the JWT
         user_id = get_jwt_identity()
 
-        # Ensure the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
+        cart = load_cart_lines(session, user_id)
+        if cart is None:
             return jsonify({"message": "User not found"}), 404
 
-        # Retrieve the user's cart
-        cart = session.query(Cart).filter_by(user_id=user_id).first()
-        if not cart:
-            return jsonify({"message": "Cart is empty"}), 400
-
-        # Retrieve items in the cart and calculate the total price
-        cart_items = session.query(CartItem).filter_by(cart_id=cart.id).all()
-        if not cart_items:
+        cart_id, lines = cart
+        if cart_id is None or not lines:
             return jsonify({"message": "Cart is empty"}), 400
 
         total_price = 0
         order_items = []
 
-        for item in cart_items:
-            product = session.query(Products).filter_by(id=item.product_id).first()
-            if product:
-                total_price += item.quantity * product.price
-                order_items.append({
-                    "product_id": product.id,
-                    "quantity": item.quantity,
-                    "price": product.price
-                })
-            else:
-                return jsonify({"message": f"Product with id {item.product_id} not found"}), 404
-
-        # Get payment method from request body
-        data = request.get_json()
-        if not data or 'payment_method' not in data:
-            return jsonify({"message": "Payment method is required"}), 400
+        for line in lines:
+            if line.found_product_id is None:
+                return jsonify({"message": f"Product with id {line.product_id} not found"}), 404
+
+            total_price += line.total_price
+            order_items.append({
+                "product_id": line.product_id,
+                "quantity": line.quantity,
+                "price": line.price
+            })
+
+        # Payment method and delivery option from the request body
+        order_fields, error = checkout_fields(request.get_json(silent=True))
+        if error:
+            return jsonify({"message": error}), 400
+        payment_method = order_fields['payment_method']
+
+        # Create the order, its items and the stock decrement in one transaction
+        try:
+            order = place_order(session, user_id, order_items, cart_id=cart_id,
+                                total_price=total_price, **order_fields)
+        except InsufficientStock as e:
+            return jsonify({"message": "Insufficient stock", "items": e.items}), 409
+        except StockConflict:
+            return jsonify({"message": "Stock is changing too fast, please try again"}), 409
 
-        payment_method = data.get('payment_method')
+        return jsonify({"message": "Checkout successful", "order_id": order.id, "total_price": total_price, "payment_method": payment_method}), 200
 
-        # Validate payment method
-        if payment_method not in ['bank_transfer', 'COD']:
-            return jsonify({"message": "Invalid payment method"}), 400
+    except SQLAlchemyError as e:
+        session.rollback()
+        return jsonify({"message": "Failed to checkout", "error": str(e)}), 500
+    finally:
+        session.close()
+    
+@cart_routes.route('/cart/reserve', methods=['POST'])
+@jwt_required()
+def reserve_cart():
+    session = Session()
 
-        # Create an order
-        order = Order(user_id=user_id, total_price=total_price, payment_method=payment_method)
-        session.add(order)
+    try:
+        user_id = get_jwt_identity()
+
+        cart = load_cart_lines(session, user_id)
+        if cart is None:
+            return jsonify({"message": "User not found"}), 404
+
+        cart_id, lines = cart
+        if cart_id is None or not lines:
+            return jsonify({"message": "Cart is empty"}), 400
+
+        quantities = {}
+        for line in lines:
+            quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+
+        try:
+            reservations = run_with_retries(session, lambda: reserve(session, user_id, quantities))
+        except InsufficientStock as e:
+            session.rollback()
+            return jsonify({"message": "Insufficient stock", "items": e.items}), 409
+        except StockConflict:
+            return jsonify({"message": "Stock is changing too fast, please try again"}), 409
+
+        reservations_data = [reservation.to_dict() for reservation in reservations]
         session.commit()
 
-        # Add order items
-        for order_item in order_items:
-            new_order_item = OrderItem(
-                order_id=order.id,
-                product_id=order_item["product_id"],
-                quantity=order_item["quantity"],
-                price=order_item["price"]
-            )
-            session.add(new_order_item)
+        return jsonify({"message": "Cart reserved", "reservations": reservations_data}), 200
 
-        # Clear the user's cart
-        session.query(CartItem).filter_by(cart_id=cart.id).delete()
+    except SQLAlchemyError as e:
+        session.rollback()
+        return jsonify({"message": "Failed to reserve cart", "error": str(e)}), 500
+    finally:
+        session.close()
+
+@cart_routes.route('/cart/reserve', methods=['DELETE'])
+@jwt_required()
+def release_cart_reservation():
+    session = Session()
+
+    try:
+        user_id = get_jwt_identity()
+        released = release_reservations(session, user_id)
         session.commit()
 
-        return jsonify({"message": "Checkout successful", "order_id": order.id, "total_price": total_price, "payment_method": payment_method}), 200
+        return jsonify({"message": "Reservation released", "released": released}), 200
 
     except SQLAlchemyError as e:
         session.rollback()
-        return jsonify({"message": "Failed to checkout", "error": str(e)}), 500
+        return jsonify({"message": "Failed to release reservation", "error": str(e)}), 500
     finally:
         session.close()
-    
+
 @cart_routes.route('/order/<int:order_id>/feedback', methods=['POST'])
 @jwt_required()
 def leave_feedback(order_id):
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
@@ -365,10 +427,13 @@ def leave_feedback(order_id):
 
         if rating_value is None:
             return jsonify({"message": "Rating cannot be null"}), 400
+        if isinstance(rating_value, bool) or not isinstance(rating_value, int) or rating_value not in STARS:
+            return jsonify({"message": "Rating must be a whole number from 1 to 5"}), 400
 
-        # Create feedback entry
+        # Create feedback entry, and count it in the product and store ratings
         feedback = Feedback(order_id=order_id, user_id=user_id, rating=rating_value, comment=comment_text)
         session.add(feedback)
+        record_rating(session, order_id, rating_value)
         session.commit()
 
         return jsonify({"message": "Feedback submitted successfully"}), 200
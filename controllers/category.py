@@ -1,7 +1,6 @@
 from flask import Blueprint, request, make_response
-from connectors.mysql_connector import connection, engine
+from connectors.mysql_connector import Session
 from models.products import Category
-from sqlalchemy.orm import sessionmaker
 from flask_login import login_required, current_user
 
 category_routes = Blueprint("category_routes", __name__)
@@ -9,9 +8,7 @@ category_routes = Blueprint("category_routes", __name__)
 @category_routes.route('/categories', methods=['POST'])
 @login_required
 def create_category():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         data = request.json
@@ -33,9 +30,7 @@ def create_category():
 @category_routes.route('/categories/<int:category_id>', methods=['GET'])
 @login_required
 def get_category(category_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         category = s.query(Category).filter(Category.category_id == category_id, Category.store_id == current_user.id).first()
@@ -57,9 +52,7 @@ def get_category(category_id):
 @category_routes.route('/Category/<int:category_id>', methods=['PUT'])
 @login_required
 def update_category(category_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         category = s.query(Category).filter(Category.category_id == category_id, Category.store_id == current_user.id).first()
@@ -82,9 +75,7 @@ def update_category(category_id):
 @category_routes.route('/categories/<int:category_id>', methods=['DELETE'])
 @login_required
 def delete_category(category_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         category = s.query(Category).filter(Category.category_id == category_id, Category.store_id == current_user.id).first()
@@ -1,16 +1,19 @@
 from flask import request, jsonify, Blueprint
-from connectors.mysql_connector import connection, engine
+from connectors.mysql_connector import Session
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError
 from marshmallow import Schema, fields, ValidationError, validate
-from models.users import User 
 from models.order import Order
 from models.cart_item import CartItem
-from models.cart import Cart
 from models.products import Products
 from models.order_item import OrderItem, OrderItemSchema
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime  # Add this line to import the datetime module
+from controllers.cart import checkout_fields, load_cart_lines
+from services.checkout import place_order, InsufficientStock, StockConflict
+from services.streaming import stream_format, stream_query
+from services.pagination import InvalidCursor, get_page_size, paginate_by_id
+from services.principals import with_principal
+from sqlalchemy.orm import selectinload
+from datetime import datetime, timedelta
 
 import logging
 
@@ -27,9 +30,33 @@ class OrderSchema(Schema):
 
 order_routes = Blueprint("order_routes", __name__)
 
+def order_item_options():
+    # Batch-load every order's items and the product names they show instead
+    # of lazy loading them per order and per item in to_dict()
+    return [
+        selectinload(Order.order_items)
+        .selectinload(OrderItem.product)
+        .load_only(Products.id, Products.name)
+    ]
+
+def parse_date_arg(name, end_of_day=False):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO date (YYYY-MM-DD) or datetime")
+    if end_of_day and len(value) == 10:
+        # A bare date in 'to' includes the whole day
+        parsed = parsed + timedelta(days=1) - timedelta(microseconds=1)
+    return parsed
+
 @order_routes.route('/order_items', methods=['POST'])
 def create_order_item():
     schema = OrderItemSchema()
+    session = Session()
+
     try:
         order_items_data = request.json
         created_order_items = []
@@ -48,10 +75,8 @@ def create_order_item():
 
             created_order_items.append(order_item)
 
-        session = connection()
         session.add_all(created_order_items)
         session.commit()
-        session.close()
 
         return jsonify({"message": "Order items created successfully", "order_items": [item.to_dict() for item in created_order_items]}), 201
 
@@ -59,23 +84,19 @@ def create_order_item():
         return jsonify({"message": "Invalid data provided", "errors": err.messages}), 400
     except SQLAlchemyError as e:
         session.rollback()
-        session.close()
         return jsonify({"message": "Database error", "error": str(e)}), 500
     except Exception as e:
         return jsonify({"message": "An unexpected error occurred", "error": str(e)}), 500
+    finally:
+        session.close()
       
 @order_routes.route("/create_order", methods=["POST"])
 @jwt_required()
-def create_order():
-    Session = sessionmaker(bind=engine)
+@with_principal('user')
+def create_order(user_id):
     session = Session()
 
     try:
-        user_id = get_jwt_identity()
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            return jsonify({"message": "User not found"}), 404
-
         data = request.get_json()
         if data is None:
             return jsonify({"message": "Invalid data provided"}), 400
@@ -86,34 +107,28 @@ def create_order():
         except ValidationError as err:
             return jsonify({"message": "Invalid data provided", "errors": err.messages}), 400
 
-        order = Order(
-            user_id=user_id,
-            payment_method=order_data["payment_method"],
-            delivery_option=order_data["delivery_option"],
-            total_price=order_data["total_price"],
-            status=order_data.get("status", "pending"),
-            review=order_data.get("review", None),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-
-        session.add(order)
-        session.flush()  # Flush to get the order ID
-
-        # Associate the cart items with the order
         cart_items = session.query(CartItem).filter_by(user_id=user_id).all()
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.price
-            )
-            session.add(order_item)
+        lines = [{
+            "product_id": cart_item.product_id,
+            "quantity": cart_item.quantity,
+            "price": cart_item.price
+        } for cart_item in cart_items]
 
-        # Clear the user's cart
-        session.query(CartItem).filter_by(user_id=user_id).delete()
-        session.commit()
+        try:
+            order = place_order(
+                session, user_id, lines,
+                payment_method=order_data["payment_method"],
+                delivery_option=order_data["delivery_option"],
+                total_price=order_data["total_price"],
+                status=order_data.get("status", "pending"),
+                review=order_data.get("review", None),
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            )
+        except InsufficientStock as e:
+            return jsonify({"message": "Insufficient stock", "items": e.items}), 409
+        except StockConflict:
+            return jsonify({"message": "Stock is changing too fast, please try again"}), 409
 
         return jsonify({"message": "Order created successfully", "order": order.to_dict()}), 201
     
@@ -125,17 +140,18 @@ def create_order():
         session.close()
 @order_routes.route("/order", methods=["GET"])
 @jwt_required()
-def get_orders():
-    Session = sessionmaker(bind=engine)
+@with_principal('user')
+def get_orders(user_id):
     session = Session()
 
     try:
-        user_id = get_jwt_identity()
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            return jsonify({"message": "User not found"}), 404
+        query = session.query(Order).filter_by(user_id=user_id).options(*order_item_options())
+
+        fmt = stream_format()
+        if fmt:
+            return stream_query(query, Order.id, lambda order: order.to_dict(), fmt)
 
-        orders = session.query(Order).filter_by(user_id=user_id).all()
+        orders = query.all()
         orders_data = [order.to_dict() for order in orders]
 
         return jsonify(orders_data), 200
@@ -146,58 +162,84 @@ def get_orders():
     finally:
         session.close()
 
+@order_routes.route("/orders/history", methods=["GET"])
+@jwt_required()
+@with_principal('user')
+def get_order_history(user_id):
+    session = Session()
+
+    try:
+        try:
+            date_from = parse_date_arg('from')
+            date_to = parse_date_arg('to', end_of_day=True)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        query = session.query(Order).filter(Order.user_id == user_id).options(*order_item_options())
+        if date_from:
+            query = query.filter(Order.created_at >= date_from)
+        if date_to:
+            query = query.filter(Order.created_at <= date_to)
+
+        # Newest first. One query for the page of orders, one for their items
+        # and one for the product names, however many orders or items there are.
+        page_size = get_page_size(request.args.get('limit', type=int))
+        orders, next_cursor = paginate_by_id(query, Order.id, request.args.get('cursor'), page_size, descending=True)
+
+        return jsonify({
+            "orders": [order.to_dict() for order in orders],
+            "next": next_cursor
+        }), 200
+
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
+    except SQLAlchemyError as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"message": "Failed to retrieve orders", "error": str(e)}), 500
+    finally:
+        session.close()
+
 @order_routes.route('/checkout', methods=['POST'])
 @jwt_required()
 def checkout(): 
-    Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
         # Get the user ID from the JWT
         user_id = get_jwt_identity()
 
-        # Ensure the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
+        cart = load_cart_lines(session, user_id)
+        if cart is None:
             return jsonify({"message": "User not found"}), 404
 
-        # Retrieve the user's cart
-        cart = session.query(Cart).filter_by(user_id=user_id).first()
-        if not cart:
-            return jsonify({"message": "Cart is empty"}), 400
-
-        # Retrieve items in the cart
-        cart_items = session.query(CartItem).filter_by(cart_id=cart.id).all()
-        if not cart_items:
+        cart_id, lines = cart
+        if cart_id is None or not lines:
             return jsonify({"message": "Cart is empty"}), 400
 
         # Calculate the total price
         total_price = 0
-        for item in cart_items:
-            product = session.query(Products).filter_by(id=item.product_id).first()
-            if product:
-                total_price += item.quantity * product.price
-            else:
-                return jsonify({"message": f"Product with id {item.product_id} not found"}), 404
-
-        # Create a new order
-        new_order = Order(user_id=user_id, total_price=total_price, status="Pending")
-        session.add(new_order)
-        session.commit()
+        for line in lines:
+            if line.found_product_id is None:
+                return jsonify({"message": f"Product with id {line.product_id} not found"}), 404
+            total_price += line.total_price
 
-        # Create order items
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=new_order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price=item.quantity * product.price
-            )
-            session.add(order_item)
+        order_fields, error = checkout_fields(request.get_json(silent=True))
+        if error:
+            return jsonify({"message": error}), 400
 
-        # Clear the user's cart
-        session.query(CartItem).filter_by(cart_id=cart.id).delete()
-        session.commit()
+        lines = [{
+            "product_id": line.product_id,
+            "quantity": line.quantity,
+            "price": line.price
+        } for line in lines]
+
+        try:
+            new_order = place_order(session, user_id, lines, cart_id=cart_id,
+                                    total_price=total_price, status="Pending", **order_fields)
+        except InsufficientStock as e:
+            return jsonify({"message": "Insufficient stock", "items": e.items}), 409
+        except StockConflict:
+            return jsonify({"message": "Stock is changing too fast, please try again"}), 409
 
         return jsonify({"message": "Checkout successful", "order_id": new_order.id}), 200
 
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, make_response
-from connectors.mysql_connector import connection, engine
+from connectors.mysql_connector import Session
 from models.products import Products, Category, ProductCategory
-from sqlalchemy.orm import sessionmaker
 from flask_login import login_required, current_user
 
 product_routes = Blueprint('product_routes', __name__)
@@ -9,9 +8,7 @@ product_routes = Blueprint('product_routes', __name__)
 @product_routes.route('/product/<int:product_id>/categories', methods=['POST'])
 @login_required
 def add_product_categories(product_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         product = s.query(Products).filter(Products.product_id == product_id).first()
@@ -40,9 +37,7 @@ def add_product_categories(product_id):
 @product_routes.route('/product/<int:product_id>/categories', methods=['DELETE'])
 @login_required
 def remove_product_categories(product_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         product = s.query(Products).filter(Products.id == product_id).first()
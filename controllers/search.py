@@ -0,0 +1,70 @@
+from flask import Blueprint, jsonify, make_response, request
+from connectors.mysql_connector import Session
+from models.products import Products
+from services.search_index import search_index
+from services.conditional import conditional_response, list_validators
+from services.product_reads import PRODUCT_COLUMNS
+from services.streaming import stream_format, stream_rows
+
+search_routes = Blueprint("search_routes", __name__)
+
+@search_routes.route('/featured-products', methods=['GET'])
+def get_featured_products():
+    limit = request.args.get('limit', default=10, type=int)
+    s = Session()
+
+    # Versions of the same featured products decide a 304
+    featured = s.query(Products).filter_by(featured=True).order_by(Products.id).limit(limit)
+    versions = featured.with_entities(Products.id, Products.version).all()
+
+    # Check if there are any featured products
+    if not versions:
+        return make_response(jsonify({"message": "No featured products found"}), 404)
+
+    def build():
+        # The columns of Products.to_dict(), as rows
+        return jsonify(featured.with_entities(*PRODUCT_COLUMNS).all())
+
+    return conditional_response(*list_validators(versions), build)
+
+@search_routes.route('/search', methods=['GET'])
+def search():
+    keyword = request.args.get('keyword')
+    if not keyword:
+        return jsonify({"message": "Keyword is required"}), 400
+
+    limit = request.args.get('limit', type=int)
+
+    search_index.ensure_fresh(Session())
+    products = search_index.search(keyword, limit=limit)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(products, lambda product: product, fmt)
+
+    if not products:
+        return jsonify({"message": "No products found"}), 404
+
+    return jsonify(products), 200
+
+@search_routes.route('/search/location', methods=['GET'])
+def search_by_location():
+    keyword = request.args.get('keyword')
+    location = request.args.get('location')
+
+    if not keyword:
+        return jsonify({"message": "Keyword is required"}), 400
+
+    limit = request.args.get('limit', type=int)
+
+    search_index.ensure_fresh(Session())
+    products = search_index.search(keyword, location=location, limit=limit)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(products, lambda product: product, fmt)
+
+    if not products:
+        return jsonify({"message": "No products found"}), 404
+
+    return jsonify(products), 200
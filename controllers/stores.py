@@ -1,18 +1,35 @@
-from flask import Blueprint, jsonify, make_response, request
-from connectors.mysql_connector import connection, engine
+from flask import Blueprint, Response, current_app, jsonify, make_response, request, stream_with_context
+from connectors.mysql_connector import Session
 from models.stores import Stores
 from models.products import Products
+from models.order import Order
+from models.order_item import OrderItem
+from models.sales import StoreDailySales, ProductDailySales
+from models.ratings import rating_summary
+from controllers.order import parse_date_arg
+from services.search_index import search_index
+from services.pagination import InvalidCursor, get_page_size, page_query, paginate_by_id
+from services.conditional import conditional_response, list_validators, validators
+from services.product_reads import OVERVIEW_COLUMNS, catalog_rows, list_item, product_rows
+from services.streaming import stream_format, stream_query
+from services.passwords import PasswordServiceBusy
+from services.admission import auth_admission
+from services.principals import with_principal
+from services.product_import import InvalidProduct, import_format, import_products, read_rows, validate_product
+from services.product_updates import apply_patches, chunked, parse_patches
 
-from sqlalchemy.orm import sessionmaker
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 store_routes = Blueprint("store_routes", __name__)
 
 @store_routes.route('/store_register', methods=['POST'])
+@auth_admission.limit('email')
 def register_seller():
-    Session = sessionmaker(connection)
     s = Session()
-    s.begin()
 
     data = request.get_json()
     if data is None or not isinstance(data, dict):
@@ -49,6 +66,10 @@ def register_seller():
         s.add(NewSeller)
         s.commit()
 
+    except PasswordServiceBusy as e:
+        s.rollback()
+        return { "message": str(e) }, 429, { "Retry-After": "1" }
+
     except Exception as e:
         print(e)
         s.rollback()
@@ -57,10 +78,9 @@ def register_seller():
     return { "message": "Register Success" }, 200
 
 @store_routes.route('/store_login', methods=['POST'])
+@auth_admission.limit('email')
 def check_login_jwt():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         data = request.json 
@@ -74,12 +94,21 @@ def check_login_jwt():
         if not store.check_password(data['password_hash']):
             return { "message": "Invalid password" }, 403
 
+        if store.password_needs_rehash():
+            # BCRYPT_ROUNDS changed since this hash was made
+            store.set_password(data['password_hash'])
+            s.commit()
+
         access_token = create_access_token(identity=store.id, additional_claims={"name": store.store_name, "id": store.id})
         return {
             "access_token": access_token,
             "message": "Login Success"
         }, 200        
 
+    except PasswordServiceBusy as e:
+        s.rollback()
+        return { "message": str(e) }, 429, { "Retry-After": "1" }
+
     except Exception as e:
         s.rollback()
         print(f"Exception: {e}")
@@ -88,9 +117,7 @@ def check_login_jwt():
 @store_routes.route('/stores/me', methods=['PUT'])
 @jwt_required()
 def update_store():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
     
     try:
         store_id = get_jwt_identity()
@@ -121,6 +148,8 @@ def update_store():
         print(str(e))
         s.rollback()
         return {"message": "Update Failed", "error": str(e)}, 500
+    finally:
+        s.close()
 
 @store_routes.route('/store_logout', methods=['POST'])
 @jwt_required()
@@ -130,9 +159,7 @@ def user_logout():
 @store_routes.route('/products', methods=['POST'])
 @jwt_required()
 def add_product():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
     
     try:
         data = request.json
@@ -141,47 +168,20 @@ def add_product():
         if not data:
             return jsonify({"message": "No input data provided"}), 400
 
-        # Required fields
-        required_fields = ['name', 'price', 'stock_quantity']
-        for field in required_fields:
-            if field not in data:
-                print(f"Missing required field: {field}")  # Log missing field
-                return jsonify({"message": f"'{field}' is a required field"}), 422
-
-        # Validate data types
-        if not isinstance(data['name'], str) or len(data['name']) > 100:
-            print(f"Invalid data type or length for 'name': {data['name']}")  # Log invalid type or length
-            return jsonify({"message": "'name' must be a string with a maximum length of 100 characters"}), 422
-        if not isinstance(data['price'], (int, float)):
-            print(f"Invalid data type for 'price': {type(data['price'])}")  # Log invalid type
-            return jsonify({"message": "'price' must be a number"}), 422
-        if not isinstance(data['stock_quantity'], int):
-            print(f"Invalid data type for 'stock_quantity': {type(data['stock_quantity'])}")  # Log invalid type
-            return jsonify({"message": "'stock_quantity' must be an integer"}), 422
-
-        # Validate optional fields
-        if 'image_url' in data and len(data['image_url']) > 255:
-            print(f"Invalid length for 'image_url': {data['image_url']}")  # Log invalid length
-            return jsonify({"message": "'image_url' must be a string with a maximum length of 255 characters"}), 422
-        if 'location' in data and len(data['location']) > 255:
-            print(f"Invalid length for 'location': {data['location']}")  # Log invalid length
-            return jsonify({"message": "'location' must be a string with a maximum length of 255 characters"}), 422
+        try:
+            values = validate_product(data)
+        except InvalidProduct as e:
+            print(f"Invalid product: {e}")  # Log the rejected field
+            return jsonify({"message": str(e)}), 422
 
         # Extract and log store_id
         store_id = get_jwt_identity()
         print(f"Store ID from JWT: {store_id}")
 
-        new_product = Products(
-            name=data['name'],
-            description=data.get('description', ''),
-            price=data['price'],
-            stock_quantity=data['stock_quantity'],
-            image_url=data.get('image_url', ''),
-            location=data.get('location', ''),
-            store_id=get_jwt_identity()
-        )
+        new_product = Products(store_id=store_id, **values)
         s.add(new_product)
         s.commit()
+        search_index.add(new_product)
         return jsonify({"message": "Product added successfully"}), 201
 
     except Exception as e:
@@ -189,84 +189,126 @@ def add_product():
         s.rollback()
         return {"message": "Update Failed", "error": str(e)}, 500
     
+@store_routes.route('/products/import', methods=['POST'])
+@jwt_required()
+@with_principal('store')
+def bulk_import_products(store_id):
+    # CSV with a header row (name,price,stock_quantity,description,image_url,location)
+    # or NDJSON, one product per line. The body is read while the response
+    # streams one NDJSON line per row error, per batch and a final summary.
+    fmt = import_format(request.content_type, request.args.get('format'))
+    if fmt is None:
+        return jsonify({"message": "Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"}), 415
+
+    rows = read_rows(request.stream, fmt)
+    events = import_products(Session(), store_id, rows, search_index=search_index)
+
+    def generate():
+        try:
+            for event in events:
+                yield current_app.json.dumps(event) + '\n'
+        except Exception as e:
+            Session().rollback()
+            print(f"Import failed: {e}")
+            yield current_app.json.dumps({"event": "failed", "message": str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @store_routes.route('/products', methods=['GET'])
 def get_products():
-    Session = sessionmaker(bind=engine)
+    fmt = stream_format()
+    if fmt:
+        # Full catalog dump, streamed in batches of STREAM_BATCH_SIZE
+        return stream_query(catalog_rows(Session()), Products.id, list_item, fmt)
+
     s = Session()
-    s.begin()
 
     try:
-        products = s.query(Products).all()      
-
-        products_list = [{
-        "id": p.id,
-        "name": p.name,
-        "price": p.price,
-        "stock": p.stock_quantity,
-        "store_id": p.store_id,
-        "image_url": p.image_url,
-        "location": p.location
-        } for p in products]
+        page_size = get_page_size(request.args.get('limit', type=int))
+        cursor = request.args.get('cursor')
+        # Versions of the same page (plus the lookahead row) decide a 304
+        versions = page_query(s.query(Products.id, Products.version), Products.id, cursor, page_size).all()
 
-        return {
-            'products': products_list,
-        }, 200
+        def build():
+            products, next_cursor = paginate_by_id(catalog_rows(s), Products.id, cursor, page_size)
+
+            products_list = [list_item(row) for row in products]
+
+            return {
+                'products': products_list,
+                'next': next_cursor
+            }, 200
 
+        return conditional_response(*list_validators(versions), build)
+
+    except InvalidCursor as e:
+        return { 'message': str(e) }, 400
     except Exception as e:
         print(e)
-        return { 'message': 'Unexpected Error' }, 500 
+        return { 'message': 'Unexpected Error' }, 500
+    finally:
+        s.close()
 
 @store_routes.route('/product/<id>', methods=['GET'])
 def get_product(id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
-
-        query = s.query(Products).filter(Products.id == id).first()
-
-        product = {
-        "id": query.id,
-        "name": query.name,
-        "description": query.description,
-        "price": query.price,
-        "stock_quantity": query.stock_quantity,
-        "image_url": query.image_url,        
-        "store_id": query.store_id
-        }
-
-        return {
-            'product': product,
-        }, 200
+        versions = s.query(Products.id, Products.version, Products.updated_at).filter(Products.id == id).all()
+        if not versions:
+            return { 'message': 'Product not found' }, 404
+
+        def build():
+            query = s.query(Products).options(joinedload(Products.rating)).filter(Products.id == id).first()
+
+            product = {
+            "id": query.id,
+            "name": query.name,
+            "description": query.description,
+            "price": query.price,
+            "stock_quantity": query.stock_quantity,
+            "image_url": query.image_url,        
+            "store_id": query.store_id,
+            "rating": rating_summary(query.rating)
+            }
+
+            return {
+                'product': product,
+            }, 200
+
+        return conditional_response(*validators(versions), build)
 
     except Exception as e:
         print(e)
         return { 'message': 'Unexpected Error' }, 500
+    finally:
+        s.close()
     
 @store_routes.route('/store/products_overview', methods=['GET'])
 @jwt_required()
 def get_products_overview():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         store_id = get_jwt_identity()
-        products = s.query(Products).filter(Products.store_id == store_id).all()
+        page_size = get_page_size(request.args.get('limit', type=int))
+        cursor = request.args.get('cursor')
+        versions = page_query(s.query(Products.id, Products.version)
+                              .filter(Products.store_id == store_id), Products.id, cursor, page_size).all()
 
-        products_list = [{
-            "id": p.id,
-            "name": p.name,
-            "price": p.price,
-            "stock_quantity": p.stock_quantity
-        } for p in products]
+        def build():
+            query = product_rows(s, OVERVIEW_COLUMNS).filter(Products.store_id == store_id)
+            products, next_cursor = paginate_by_id(query, Products.id, cursor, page_size)
 
-        return jsonify({
-            "products": products_list,
-        }), 200
+            return jsonify({
+                "products": products,
+                "next": next_cursor
+            }), 200
 
+        return conditional_response(*list_validators(versions), build, private=True)
+
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({"message": "Failed to fetch product overview"}), 500
@@ -274,9 +316,7 @@ def get_products_overview():
 @store_routes.route('/update_product/<int:product_id>', methods=['PUT'])
 @jwt_required()
 def update_product(product_id):
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         product = s.query(Products).filter(Products.id == product_id).first()
@@ -302,18 +342,41 @@ def update_product(product_id):
         product.location = data['location']
 
     s.commit()
+    search_index.add(product)
     s.close()
     print("Product updated successfully")
     # Return a success response
     return jsonify({"message": "Product updated successfully"}), 200
 
+@store_routes.route('/products', methods=['PATCH'])
+@jwt_required()
+@with_principal('store')
+def bulk_update_products(store_id):
+    # [{"id": 1, "price": 9.5, "stock_quantity": 20}, ...] or {"products": [...]}
+    data = request.get_json(silent=True)
+    items = data.get('products') if isinstance(data, dict) else data
+    patches, errors = parse_patches(items)
+    if errors:
+        return jsonify({"message": "Invalid product patches", "errors": errors}), 422
+
+    s = Session()
+    try:
+        updated, missing = apply_patches(s, store_id, patches)
+        s.commit()
+    except Exception as e:
+        print(e)
+        s.rollback()
+        return jsonify({"message": "Failed to update products"}), 500
+
+    for chunk in chunked(updated, current_app.config['BULK_UPDATE_CHUNK']):
+        for product in s.query(Products).filter(Products.id.in_(chunk)):
+            search_index.add(product)
+    return jsonify({"updated": updated, "missing": missing}), 200
+
 @store_routes.route('/remove_product/<int:product_id>', methods=['DELETE'])
 @jwt_required()
 def remove_product(product_id):
-    Session = sessionmaker(bind=engine)
-
     s = Session()
-    s.begin()
 
     try:
         product = s.query(Products).filter(Products.id == product_id).first()
@@ -322,6 +385,7 @@ def remove_product(product_id):
 
         s.delete(product)
         s.commit()
+        search_index.remove(product_id)
         print("Product removed successfully")
         return jsonify({"message": "Product removed successfully"}), 200
     except Exception as e:
@@ -334,34 +398,38 @@ def remove_product(product_id):
 @store_routes.route('/store/info', methods=['GET'])
 @jwt_required()
 def get_store_info():
-    Session = sessionmaker(bind=engine)
     s = Session()
-    s.begin()
 
     try:
         store_id = get_jwt_identity()
-        store = s.query(Stores).filter(Stores.id == store_id).first()
+        versions = s.query(Stores.id, Stores.version, Stores.updated_at).filter(Stores.id == store_id).all()
 
-        if store is None:
+        if not versions:
             return jsonify({"message": "Store not found"}), 404
 
-        store_info = {
-            "store_name": store.store_name,
-            "email": store.email,
-            "description": store.description,
-            "bank_account": store.bank_account,
-            "contact_number": store.contact_number,
-            "address": store.address,
-            "city": store.city,
-            "state": store.state,
-            "zip_code": store.zip_code,
-            "image_url": store.image_url,
-            "seller_full_name": store.seller_full_name,
-            "username": store.username,
-            "created_at": store.created_at
-        }
-
-        return jsonify(store_info), 200
+        def build():
+            store = s.query(Stores).options(joinedload(Stores.rating)).filter(Stores.id == store_id).first()
+
+            store_info = {
+                "store_name": store.store_name,
+                "email": store.email,
+                "description": store.description,
+                "bank_account": store.bank_account,
+                "contact_number": store.contact_number,
+                "address": store.address,
+                "city": store.city,
+                "state": store.state,
+                "zip_code": store.zip_code,
+                "image_url": store.image_url,
+                "seller_full_name": store.seller_full_name,
+                "username": store.username,
+                "created_at": store.created_at,
+                "rating": rating_summary(store.rating)
+            }
+
+            return jsonify(store_info), 200
+
+        return conditional_response(*validators(versions), build, private=True)
 
     except Exception as e:
         print(e)
@@ -369,26 +437,106 @@ def get_store_info():
 
 @store_routes.route('/store/orders', methods=['GET'])
 @jwt_required()
-def get_orders():
-    Session = sessionmaker(bind=engine)
+@with_principal('store')
+def get_orders(store_id):
+    # The store's sold items, newest first, a page at a time
     s = Session()
-    s.begin()
 
     try:
-        store_id = get_jwt_identity()
-        orders = s.query(Orders).filter(Orders.store_id == store_id).all()
+        query = s.query(
+            OrderItem.id,
+            OrderItem.order_id,
+            OrderItem.product_id,
+            OrderItem.quantity,
+            OrderItem.price,
+            Order.user_id,
+            Order.status,
+            Order.created_at,
+            Products.name.label('product_name')
+        ) \
+            .join(Products, Products.id == OrderItem.product_id) \
+            .join(Order, Order.id == OrderItem.order_id) \
+            .filter(Products.store_id == store_id)
+        page_size = get_page_size(request.args.get('limit', type=int))
+        rows, next_cursor = paginate_by_id(query, OrderItem.id, request.args.get('cursor'), page_size, descending=True)
 
         orders_list = [{
-            "order_id": o.id,
-            "total_amount": o.total,
-            "delivery_date": o.delivery_date 
-        } for o in orders]
+            "order_id": row.order_id,
+            "user_id": row.user_id,
+            "product_id": row.product_id,
+            "product_name": row.product_name,
+            "quantity": row.quantity,
+            "price": row.price,
+            "status": row.status,
+            "created_at": row.created_at
+        } for row in rows]
 
         return jsonify({
-            "orders": orders_list
+            "orders": orders_list,
+            "next": next_cursor
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({"message": "Failed to fetch orders"}), 500
 
+@store_routes.route('/store/analytics', methods=['GET'])
+@jwt_required()
+@with_principal('store')
+def get_store_analytics(store_id):
+    # Served from the daily rollups that checkout keeps up to date, so the
+    # cost depends on the number of days asked for, not on the order volume
+    s = Session()
+
+    try:
+        try:
+            date_from = parse_date_arg('from')
+            date_to = parse_date_arg('to')
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        date_to = date_to.date() if date_to else datetime.utcnow().date()
+        date_from = date_from.date() if date_from else date_to - timedelta(days=current_app.config['ANALYTICS_DAYS'] - 1)
+
+        days = s.query(StoreDailySales) \
+            .filter(StoreDailySales.store_id == store_id, StoreDailySales.day.between(date_from, date_to)) \
+            .order_by(StoreDailySales.day) \
+            .all()
+
+        limit = max(1, min(request.args.get('top', current_app.config['ANALYTICS_TOP_PRODUCTS'], type=int), 100))
+        revenue = func.sum(ProductDailySales.revenue).label('revenue')
+        top_products = s.query(
+            ProductDailySales.product_id,
+            Products.name,
+            revenue,
+            func.sum(ProductDailySales.units).label('units'),
+            func.sum(ProductDailySales.orders).label('orders')
+        ).join(Products, Products.id == ProductDailySales.product_id) \
+            .filter(ProductDailySales.store_id == store_id, ProductDailySales.day.between(date_from, date_to)) \
+            .group_by(ProductDailySales.product_id, Products.name) \
+            .order_by(revenue.desc()) \
+            .limit(limit) \
+            .all()
+
+        return jsonify({
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "totals": {
+                "revenue": sum((day.revenue for day in days), Decimal(0)),
+                "units": sum(day.units for day in days),
+                "orders": sum(day.orders for day in days)
+            },
+            "days": [dict(day.to_dict(), day=day.day.isoformat()) for day in days],
+            "top_products": [{
+                "product_id": row.product_id,
+                "name": row.name,
+                "revenue": row.revenue,
+                "units": row.units,
+                "orders": row.orders
+            } for row in top_products]
+        }), 200
+
+    except Exception as e:
+        print(e)
+        return jsonify({"message": "Failed to fetch analytics"}), 500
@@ -0,0 +1,155 @@
+from flask import Blueprint, current_app, jsonify, make_response, request, send_from_directory
+from connectors.mysql_connector import Session
+from connectors.storage import create_storage, CACHE_CONTROL
+from models.products import Products
+from models.users import User
+from services.search_index import search_index
+from services.uploads import UploadManager, UploadQueueFull, content_name, is_content_hash
+
+import os
+
+upload_routes = Blueprint("upload_routes", __name__)
+
+def get_storage():
+    # Built on first use; tests can put their own backend in app.extensions
+    # (or STORAGE_BACKEND) beforehand
+    if 'storage' not in current_app.extensions:
+        current_app.extensions['storage'] = create_storage(current_app.config)
+    return current_app.extensions['storage']
+
+def get_uploads():
+    # Built on first use from the app config, like the storage backend
+    if 'uploads' not in current_app.extensions:
+        config = current_app.config
+        current_app.extensions['uploads'] = UploadManager(
+            workers=config['UPLOAD_WORKERS'],
+            max_pending=config['UPLOAD_MAX_PENDING'],
+            retries=config['UPLOAD_RETRIES'],
+            spool_dir=config['UPLOAD_SPOOL_DIR'],
+            status_ttl=config['UPLOAD_STATUS_TTL']
+        )
+    return current_app.extensions['uploads']
+
+@upload_routes.route('/storage/status', methods=['GET'])
+def get_storage_status():
+    return jsonify(get_storage().status()), 200
+
+@upload_routes.route('/upload', methods=['POST'])
+def upload_image():
+    file = request.files.get('image')
+
+    if file and file.filename:
+        try:
+            # Validate file type (example: only allow images)
+            if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                return jsonify({"error": "Invalid file type"}), 400
+
+            # The file is hashed and spooled to disk here and sent to storage
+            # in the background, unless the same bytes are already stored
+            upload_id, content_hash, public_url = get_uploads().submit(get_storage(), file)
+
+            return make_response(jsonify({
+                "upload_id": upload_id,
+                "status": "pending",
+                "status_url": f"/upload/{upload_id}",
+                "hash": content_hash,
+                "url": public_url
+            }), 202)
+        except UploadQueueFull as e:
+            return jsonify({"error": str(e)}), 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return jsonify({"error": "No file uploaded"}), 400
+
+@upload_routes.route('/upload/<upload_id>', methods=['GET'])
+def get_upload_status(upload_id):
+    status = get_uploads().status(upload_id)
+    if status is None:
+        return jsonify({"error": "Upload not found"}), 404
+
+    return jsonify({"upload_id": upload_id, **status}), 200
+
+@upload_routes.route('/media/<path:name>', methods=['GET'])
+def get_media(name):
+    # Only used by the local storage backend
+    storage_backend = get_storage()
+    if storage_backend.name != 'local':
+        return jsonify({"error": "Not found"}), 404
+
+    response = send_from_directory(
+        os.path.abspath(storage_backend.root), name,
+        mimetype=storage_backend.content_type(name)
+    )
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def resolve_image(data):
+    # Either a plain image_url, or the hash of an image that is already in
+    # storage, which is turned into its URL without uploading anything. The
+    # hash /upload returns can be used straight away: while its transfer is
+    # still pending the URL is set already, and it serves once the transfer
+    # is done. If the transfer fails (see /upload/<id>) the image has to be
+    # uploaded again.
+    image_hash = data.get('image_hash')
+    if image_hash is None:
+        return data.get('image_url'), None
+    if not is_content_hash(image_hash):
+        return None, None
+    storage_backend = get_storage()
+    if not get_uploads().is_pending(image_hash) and not storage_backend.exists(content_name(image_hash)):
+        return None, None
+    return storage_backend.public_url(content_name(image_hash)), image_hash
+
+@upload_routes.route('/store_image_url', methods=['POST'])
+def store_image_url():
+    data = request.json
+    print("Received data:", data)
+    id = data.get('id')
+    image_url, image_hash = resolve_image(data)
+
+    if id and image_url:
+        s = Session()
+        try:
+            product = s.query(Products).filter_by(id=id).first()
+            if product:
+                product.image_url = image_url
+                product.image_hash = image_hash
+                s.commit()
+                search_index.add(product)
+                return jsonify({"message": "Image URL updated successfully"}), 200
+            else:
+                return jsonify({"message": "Product not found"}), 404
+        except Exception as e:
+            s.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            s.close()
+    else:
+        return jsonify({"message": "Product ID and an image URL or stored image hash are required"}), 400
+
+@upload_routes.route('/user_image', methods=['POST'])
+def store_image():
+    data = request.json
+    print("Received data:", data)
+    id = data.get('id')
+    image_url, image_hash = resolve_image(data)
+
+    if id and image_url:
+        s = Session()
+        try:
+            user = s.query(User).filter_by(id=id).first()
+            if user:
+                user.image_url = image_url
+                user.image_hash = image_hash
+                s.commit()
+                return jsonify({"message": "Image updated successfully"}), 200
+            else:
+                return jsonify({"message": "User not found"}), 404
+        except Exception as e:
+            s.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            s.close()
+    else:
+        return jsonify({"message": "User ID and an image URL or stored image hash are required"}), 400
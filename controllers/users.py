@@ -1,14 +1,16 @@
 from flask import Blueprint, jsonify, request
-from connectors.mysql_connector import engine
+from connectors.mysql_connector import Session
 from models.users import User
 from models.order import Order 
-from sqlalchemy.orm import sessionmaker
+from services.pagination import InvalidCursor, get_page_size, paginate_by_id
+from services.passwords import PasswordServiceBusy
+from services.admission import auth_admission
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 
 user_routes = Blueprint("user_routes", __name__)
-Session = sessionmaker(bind=engine)
 
 @user_routes.route('/register', methods=['POST'])
+@auth_admission.limit('email')
 def register_user():
     session = Session()
 
@@ -46,6 +48,10 @@ def register_user():
         session.commit()
         return jsonify({"message": "Register Success"}), 200
 
+    except PasswordServiceBusy as e:
+        session.rollback()
+        return jsonify({"message": str(e)}), 429, {"Retry-After": "1"}
+
     except Exception as e:
         session.rollback()
         print(f"Exception: {e}")
@@ -55,6 +61,7 @@ def register_user():
         session.close()
 
 @user_routes.route('/login', methods=['POST'])
+@auth_admission.limit('email')
 def check_login():
     session = Session()
 
@@ -68,6 +75,11 @@ def check_login():
         if not user or not user.check_password(data['password']):
             return jsonify({"message": "Invalid email or password"}), 403
 
+        if user.password_needs_rehash():
+            # BCRYPT_ROUNDS changed since this hash was made
+            user.set_password(data['password'])
+            session.commit()
+
         # Create a JWT token
         access_token = create_access_token(identity=user.id, additional_claims={
             "email": user.email,
@@ -76,6 +88,10 @@ def check_login():
         })
         return jsonify({"access_token": access_token, "message": "Login Success"}), 200
 
+    except PasswordServiceBusy as e:
+        session.rollback()
+        return jsonify({"message": str(e)}), 429, {"Retry-After": "1"}
+
     except Exception as e:
         print(e)
         session.rollback()
@@ -96,7 +112,15 @@ def get_user_dashboard_data():
         if not user:
             return jsonify({"message": "User not found"}), 404
 
-        transactions = session.query(Order).filter_by(user_id=user_id).all()
+        # Only the latest page of orders; older ones via the 'cursor' arg
+        page_size = get_page_size(request.args.get('limit', type=int))
+        transactions, next_cursor = paginate_by_id(
+            session.query(Order).filter_by(user_id=user_id),
+            Order.id,
+            request.args.get('cursor'),
+            page_size,
+            descending=True
+        )
 
         data = {
             "user": {
@@ -119,10 +143,13 @@ def get_user_dashboard_data():
                     "status": transaction.status,
                     "created_at": transaction.created_at
                 } for transaction in transactions
-            ]
+            ],
+            "transactions_next": next_cursor
         }
         return jsonify(data), 200
 
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         print(f"Error: {e}")
         session.rollback()
@@ -0,0 +1,23 @@
+# Picked up by `gunicorn wsgi:app` from the working directory
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT
+
+# Import the app once in the master so workers share its memory. The
+# database engine is lazy and rebuilt per worker after the fork, so no
+# connection is shared between processes.
+preload_app = True
+
+def post_fork(server, worker):
+    # Also registered with os.register_at_fork; called here so the reset
+    # does not depend on how the server forks.
+    from connectors.mysql_connector import after_fork
+    after_fork()
+    server.log.info("Worker %s: database pool reset", worker.pid)
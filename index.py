@@ -1,213 +1,152 @@
-from flask import Flask, jsonify, make_response, request
+import click
+from flask import Flask, jsonify, make_response
 from dotenv import load_dotenv
-from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from connectors.mysql_connector import connection
 
-from sqlalchemy.orm import sessionmaker
-
-from controllers.stores import store_routes
-from controllers.users import user_routes
-from controllers.category import category_routes
-from controllers.product_category import product_routes
-from controllers.cart import cart_routes
-from controllers.order import order_routes
-
-
-import os
-
-from flask_login import LoginManager
-from flask_jwt_extended import JWTManager
-from models.stores import Stores
-from models.users import User
-from models.products import Products
-
-from google.cloud import storage
-
-load_dotenv()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
-db = SQLAlchemy(app)
-app.config.from_object('config.Config')
-
-jwt = JWTManager(app)
-
-CORS(app, supports_credentials=True, origins=['http://localhost:3000'])
-
-app.register_blueprint(store_routes)
-app.register_blueprint(user_routes)
-app.register_blueprint(category_routes)
-app.register_blueprint(product_routes)
-app.register_blueprint(cart_routes)
-app.register_blueprint(order_routes)
-
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'user_routes.check_login'
-
-@login_manager.user_loader
-def load_user(user_id):
-    Session = sessionmaker(connection)
-    s = Session()
-    return s.query(Stores).get(int(user_id))
-
-@login_manager.user_loader
-def load_user(user_id):
-    Session = sessionmaker(connection)
-    s = Session()
-    return s.query(User).get(int(user_id))
-
-@login_manager.unauthorized_handler
-def unauthorized():
-    return make_response(jsonify({"message": "Unauthorized access"}), 401)
-
-@app.route("/")
-def hello_world():
-    return "Hello World"
-
-@app.route('/featured-products', methods=['GET'])
-def get_featured_products():
-    limit = request.args.get('limit', default=10, type=int)
-    Session = sessionmaker(connection)
-    s = Session()
-
-    # Query the database for featured products
-    featured_products = s.query(Products).filter_by(featured=True).limit(limit).all()
-
-    # Check if there are any featured products
-    if not featured_products:
-        return make_response(jsonify({"message": "No featured products found"}), 404)
-
-    # Convert the products to a JSON response
-    featured_products = [product.to_dict() for product in featured_products]
-    response = jsonify(featured_products)
-    return response
-
-storage_client = storage.Client.from_service_account_json(app.config['GCS_CREDENTIALS'])
-bucket = storage_client.get_bucket(app.config['GCS_BUCKET_NAME'])
-
-@app.route('/upload', methods=['POST'])
-def upload_image():
-    file = request.files.get('image')
-
-    if file and file.filename:
+def create_app(config=None):
+    """Build the Flask app.
+
+    ``config`` is a dict of settings applied over config.Config, e.g.
+    {"DATABASE_URL": "sqlite:///localbites.db", "STORAGE_BACKEND": "local"}
+    for an offline run. Creating the app does not connect to the database
+    or to GCS; both happen on first use.
+    """
+    load_dotenv()
+
+    from flask_cors import CORS
+    from flask_login import LoginManager
+    from flask_jwt_extended import JWTManager
+    from connectors.mysql_connector import init_app, pool_status
+
+    from services.json_provider import FastJSONProvider
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object('config.Config')
+    if config:
+        app.config.update(config)
+
+    jwt = JWTManager(app)
+    init_app(app)
+
+    # What the services read, see config.Settings
+    from config import settings
+    settings.load(app.config)
+
+    CORS(app, supports_credentials=True, origins=['http://localhost:3000'])
+
+    from controllers.stores import store_routes
+    from controllers.users import user_routes
+    from controllers.category import category_routes
+    from controllers.product_category import product_routes
+    from controllers.cart import cart_routes
+    from controllers.order import order_routes
+    from controllers.search import search_routes
+    from controllers.uploads import upload_routes
+
+    app.register_blueprint(store_routes)
+    app.register_blueprint(user_routes)
+    app.register_blueprint(category_routes)
+    app.register_blueprint(product_routes)
+    app.register_blueprint(cart_routes)
+    app.register_blueprint(order_routes)
+    app.register_blueprint(search_routes)
+    app.register_blueprint(upload_routes)
+
+    from services import compression
+    compression.init_app(app)
+
+    from services.principals import load_login
+
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = 'user_routes.check_login'
+
+    @login_manager.user_loader
+    def load_user(login_id):
+        # "user:<id>" or "store:<id>", see User.get_id and Stores.get_id
+        return load_login(login_id)
+
+    @login_manager.unauthorized_handler
+    def unauthorized():
+        return make_response(jsonify({"message": "Unauthorized access"}), 401)
+
+    @app.route("/")
+    def hello_world():
+        return "Hello World"
+
+    @app.route('/db/pool', methods=['GET'])
+    def get_pool_status():
+        return jsonify(pool_status()), 200
+
+    @app.route('/auth/admission', methods=['GET'])
+    def get_auth_admission():
+        from services.admission import auth_admission
+        return jsonify(auth_admission.stats()), 200
+
+    @app.route('/auth/principals', methods=['GET'])
+    def get_principal_cache():
+        from services.principals import principals, login_accounts
+        return jsonify({"principals": principals.stats(), "logins": login_accounts.stats()}), 200
+
+    register_commands(app)
+    return app
+
+def register_commands(app):
+    from connectors.mysql_connector import Session, get_engine
+
+    @app.cli.command('create-tables')
+    def create_tables_command():
+        """Create any missing tables, e.g. in a local SQLite database."""
+        from models.base import Base
+        import models.users, models.stores, models.products, models.cart, models.cart_item
+        import models.order, models.order_item, models.feedback, models.reservation, models.sales
+        import models.ratings
+        Base.metadata.create_all(get_engine())
+        print("Tables created")
+
+    @app.cli.command('expire-reservations')
+    def expire_reservations_command():
+        """Return stock held by reservations whose TTL has run out."""
+        from services.inventory import expire_reservations
+        s = Session()
         try:
-            # Validate file type (example: only allow images)
-            if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                return jsonify({"error": "Invalid file type"}), 400
-
-            public_url = f"https://storage.googleapis.com/{app.config['GCS_BUCKET_NAME']}/{file.filename}"
-            blob = bucket.blob(file.filename)
-            blob.upload_from_file(file)
-
-            print(f"File uploaded to {public_url}")
-
-            return make_response(jsonify({"url": public_url}), 200)
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
-
-    return jsonify({"error": "No file uploaded"}), 400
-
-@app.route('/store_image_url', methods=['POST'])
-def store_image_url():
-    data = request.json
-    print("Received data:", data)
-    id = data.get('id')
-    image_url = data.get('image_url')
+            expired = expire_reservations(s)
+            s.commit()
+            print(f"Expired {expired} reservations")
+        finally:
+            s.close()
 
-    if id and image_url:
-        Session = sessionmaker(bind=connection)
+    @app.cli.command('rebuild-sales')
+    @click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild')
+    @click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild')
+    def rebuild_sales_command(date_from, date_to):
+        """Recompute the store and product sales rollups from orders."""
+        from services.sales import rebuild_sales
         s = Session()
         try:
-            product = s.query(Products).filter_by(id=id).first()
-            if product:
-                product.image_url = image_url
-                s.commit()
-                return jsonify({"message": "Image URL updated successfully"}), 200
-            else:
-                return jsonify({"message": "Product not found"}), 404
-        except Exception as e:
+            rebuild_sales(s, date_from and date_from.date(), date_to and date_to.date())
+            s.commit()
+            print("Sales rollups rebuilt")
+        except Exception:
             s.rollback()
-            return jsonify({"error": str(e)}), 500
+            raise
         finally:
             s.close()
-    else:
-        return jsonify({"message": "Product ID and image URL are required"}), 400
-
-@app.route('/user_image', methods=['POST'])
-def store_image():
-    data = request.json
-    print("Received data:", data)
-    id = data.get('id')
-    image_url = data.get('image_url')
-
-    if id and image_url:
-        Session = sessionmaker(bind=connection)
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings_command():
+        """Recompute the product and store rating totals from feedback."""
+        from services.ratings import rebuild_ratings
         s = Session()
         try:
-            user = s.query(User).filter_by(id=id).first()
-            if user:
-                user.image_url = image_url
-                s.commit()
-                return jsonify({"message": "Image updated successfully"}), 200
-            else:
-                return jsonify({"message": "User not found"}), 404
-        except Exception as e:
+            rebuild_ratings(s)
+            s.commit()
+            print("Ratings rebuilt")
+        except Exception:
             s.rollback()
-            return jsonify({"error": str(e)}), 500
+            raise
         finally:
             s.close()
-    else:
-        return jsonify({"message": "User ID and image are required"}), 400
-    
-@app.route('/search', methods=['GET'])
-def search():
-    session = sessionmaker(bind=connection)
-    session = session()
-
-    keyword = request.args.get('keyword')
-    if not keyword:
-        return jsonify({"message": "Keyword is required"}), 400
-
-    results = session.query(Products).filter(
-        (Products.name.ilike(f'%{keyword}%')) | 
-        (Products.description.ilike(f'%{keyword}%'))
-    ).all()
-
-    if not results:
-        return jsonify({"message": "No products found"}), 404
-
-    products = [product.to_dict() for product in results]
-    return jsonify(products), 200
-
-@app.route('/search/location', methods=['GET'])
-def search_by_location():
-    session = sessionmaker(bind=connection)
-    session = session()
-
-    keyword = request.args.get('keyword')
-    location = request.args.get('location')
-
-    if not keyword:
-        return jsonify({"message": "Keyword is required"}), 400
-
-    query = session.query(Products).filter(
-        (Products.name.ilike(f'%{keyword}%')) | 
-        (Products.description.ilike(f'%{keyword}%'))
-    )
-
-    if location:
-        query = query.filter(Products.location.ilike(f'%{location}%'))
-
-    results = query.all()
-
-    if not results:
-        return jsonify({"message": "No products found"}), 404
 
-    products = [product.to_dict() for product in results]
-    return jsonify(products), 200
-    
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    create_app().run(port=5000, debug=True)
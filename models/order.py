@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Numeric
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from models.base import Base
@@ -8,9 +8,9 @@ class Order(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    total_price = Column(Integer, nullable=False)
+    total_price = Column(Numeric(10, 2), nullable=False)
     payment_method = Column(String(50), nullable=False)
-    delivery_option = Column(String, nullable=False)
+    delivery_option = Column(String(50), nullable=False)
     status = Column(String(50), default='pending')
     review = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Numeric
 from sqlalchemy.orm import relationship
 from models.base import Base 
 from models.products import Products
@@ -11,7 +11,7 @@ class OrderItem(Base):
     order_id = Column(Integer, ForeignKey('orders.id') , nullable=False)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
     quantity = Column(Integer, nullable=False)
-    price = Column(Integer, nullable=False)
+    price = Column(Numeric(10, 2), nullable=False)  # Same as Products.price; the sales rollups sum it
 
     order = relationship('Order', back_populates='order_items')
     product = relationship('Products', back_populates='order_items')  # Use string reference here
@@ -1,7 +1,9 @@
 from models.base import Base
 from sqlalchemy import Integer, String, Text, Numeric, DateTime, Column, ForeignKey, Table, Boolean
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, object_session
+from sqlalchemy import event
+from models.ratings import ProductRating
 
 # Step 1: Define the Category model
 class Category(Base):
@@ -32,16 +34,19 @@ class Products(Base):
     price = Column(Numeric(10, 2), nullable=False)  # Ensure consistency with DB
     stock_quantity = Column(Integer, nullable=False)
     image_url = Column(String(255))
+    image_hash = Column(String(64))  # sha256 of the stored image, if uploaded here
     location = Column(String(255))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.current_timestamp())
     featured = Column(Boolean, default=False)  # Changed to Boolean for clarity
     store_id = Column(Integer, ForeignKey('store.id'), nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # Bumped by every write, see bump_version
 
     store = relationship("Stores", back_populates="products")
     categories = relationship('ProductCategory', back_populates='product')
     order_items = relationship('OrderItem', back_populates='product')
     cart_items = relationship('CartItem', back_populates='product')
+    rating = relationship(ProductRating, uselist=False, viewonly=True)  # Load with joinedload() in listings
 
     def to_dict(self):
         return {
@@ -54,4 +59,11 @@ class Products(Base):
             'location': self.location,
             'featured': self.featured,
             'store_id': self.store_id
-        }
\ No newline at end of file
+        }
+
+@event.listens_for(Products, 'before_update')
+def bump_version(mapper, connection, target):
+    # Core UPDATEs (stock, bulk patches) bump it themselves. The optimistic
+    # stock strategy and the catalog ETags rely on it changing on every write.
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = Products.version + 1
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from models.base import Base
+
+STARS = range(1, 6)
+
+# Rating totals kept up to date as feedback comes in (services/ratings.py),
+# so a product or store page reads one row instead of joining feedback
+# through orders and order items.
+class RatingTotals:
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)  # Sum of the ratings
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return totals_dict(self.count, self.total, [getattr(self, f'stars_{stars}') for stars in STARS])
+
+def totals_dict(count, total, histogram):
+    return {
+        'count': count,
+        'average': round(total / count, 2) if count else None,
+        'histogram': {str(stars): votes for stars, votes in zip(STARS, histogram)}
+    }
+
+def rating_summary(rating):
+    # For products and stores nobody has rated yet
+    if rating is None:
+        return totals_dict(0, 0, [0 for _ in STARS])
+    return rating.to_dict()
+
+def rating_columns(model):
+    # For column queries that outer join the totals, read by rating_from_row
+    return [model.count.label('rating_count'), model.total.label('rating_total')] + \
+        [getattr(model, f'stars_{stars}').label(f'rating_stars_{stars}') for stars in STARS]
+
+def rating_from_row(row):
+    if row.rating_count is None:
+        return rating_summary(None)
+    return totals_dict(row.rating_count, row.rating_total, [getattr(row, f'rating_stars_{stars}') for stars in STARS])
+
+class ProductRating(RatingTotals, Base):
+    __tablename__ = 'product_ratings'
+
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+
+class StoreRating(RatingTotals, Base):
+    __tablename__ = 'store_ratings'
+
+    store_id = Column(Integer, ForeignKey('store.id'), primary_key=True)
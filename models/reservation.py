@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from models.base import Base
+
+class StockReservation(Base):
+    __tablename__ = 'stock_reservations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default='active')  # active, confirmed, released, expired
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    product = relationship('Products')
+
+    __table_args__ = (
+        Index('ix_stock_reservations_user_status', 'user_id', 'status'),
+        Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'status': self.status,
+            'expires_at': self.expires_at
+        }
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, Numeric, Date, ForeignKey, Index
+from models.base import Base
+
+# Running totals per day, kept up to date by checkout (services/sales.py) so
+# the seller dashboard never has to scan order_items.
+class StoreDailySales(Base):
+    __tablename__ = 'store_daily_sales'
+
+    store_id = Column(Integer, ForeignKey('store.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day,
+            'revenue': self.revenue,
+            'units': self.units,
+            'orders': self.orders
+        }
+
+class ProductDailySales(Base):
+    __tablename__ = 'product_daily_sales'
+
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    store_id = Column(Integer, ForeignKey('store.id'), nullable=False)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_product_daily_sales_store_day', 'store_id', 'day'),
+    )
@@ -2,10 +2,12 @@ from models.base import Base
 
 from sqlalchemy.sql import func
 from sqlalchemy import Integer, String, DateTime
-from sqlalchemy.orm import mapped_column, relationship
+from sqlalchemy.orm import mapped_column, relationship, object_session
+from sqlalchemy import event
 from flask_login import UserMixin
+from models.ratings import StoreRating
 
-import bcrypt
+from services.passwords import passwords
 
 class Stores(Base, UserMixin):
     __tablename__ = 'store'
@@ -26,10 +28,25 @@ class Stores(Base, UserMixin):
     zip_code = mapped_column(String(20), nullable=False)
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.current_timestamp())
+    version = mapped_column(Integer, nullable=False, default=1, server_default='1')  # Bumped by every write, for ETags
+
+    def get_id(self):
+        # Typed, so the login loader can tell stores from users
+        return f"store:{self.id}"
+
     def set_password(self, password_hash):
-        self.password_hash = bcrypt.hashpw(password_hash.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = passwords.hash(password_hash)
 
     def check_password(self, password_hash):
-        return bcrypt.checkpw(password_hash.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return passwords.verify(password_hash, self.password_hash)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
     
-    products = relationship("Products", back_populates="store", cascade="all, delete-orphan")
\ No newline at end of file
+    products = relationship("Products", back_populates="store", cascade="all, delete-orphan")
+    rating = relationship(StoreRating, uselist=False, viewonly=True)
+
+@event.listens_for(Stores, 'before_update')
+def bump_version(mapper, connection, target):
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = Stores.version + 1
@@ -5,7 +5,7 @@ from sqlalchemy import Integer, String, DateTime
 from sqlalchemy.orm import mapped_column, relationship
 from flask_login import UserMixin
 
-import bcrypt
+from services.passwords import passwords
 
 class User(Base, UserMixin):
     __tablename__ = 'users'
@@ -21,6 +21,7 @@ class User(Base, UserMixin):
     state = mapped_column(String(100), nullable=True)
     zip_code = mapped_column(String(20), nullable=True)
     image_url = mapped_column(String(255), nullable=True)
+    image_hash = mapped_column(String(64), nullable=True)
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.current_timestamp())
 
@@ -29,8 +30,15 @@ class User(Base, UserMixin):
     orders = relationship('Order', back_populates='user')
     feedback = relationship('Feedback', back_populates='user')
 
+    def get_id(self):
+        # Typed, so the login loader can tell users from stores
+        return f"user:{self.id}"
+
     def set_password(self, password):
-        self.password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password = passwords.hash(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
\ No newline at end of file
+        return passwords.verify(password, self.password)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password)
@@ -0,0 +1,136 @@
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from flask import jsonify, request
+
+from config import settings
+from services.passwords import passwords
+
+class TokenBuckets:
+    """Token buckets per key; rate and burst are named by their settings."""
+
+    def __init__(self, rate_setting, burst_setting):
+        self.rate_setting = rate_setting
+        self.burst_setting = burst_setting
+        self._buckets = OrderedDict()  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return getattr(settings, self.rate_setting)
+
+    @property
+    def burst(self):
+        return getattr(settings, self.burst_setting)
+
+    def take(self, key, now=None):
+        """Take a token for key. Returns 0 if allowed, else seconds to wait."""
+        now = time.monotonic() if now is None else now
+        rate, burst = self.rate, self.burst
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else math.inf
+            self._buckets[key] = (tokens, now)
+            # Least recently used buckets go first
+            if len(self._buckets) > settings.AUTH_MAX_TRACKED:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+@lru_cache(maxsize=8)
+def parse_networks(value):
+    # Parsed once per value; a tuple, since the cache hands out the same object
+    return tuple(ipaddress.ip_network(part.strip(), strict=False) for part in value.split(',') if part.strip())
+
+def client_ip(remote_addr, forwarded_for, trusted_proxies):
+    """The address a request came from, looking through trusted proxies only.
+
+    Walks X-Forwarded-For from the nearest hop back and stops at the first
+    address that is not a trusted proxy, so a client cannot pick its own
+    bucket by sending the header itself.
+    """
+    hops = [remote_addr]
+    if forwarded_for:
+        hops += [hop.strip() for hop in reversed(forwarded_for.split(','))]
+    for hop in hops:
+        try:
+            address = ipaddress.ip_address(hop)
+        except ValueError:
+            return hop or None
+        if not any(address in network for network in trusted_proxies):
+            return hop
+    # Nothing but proxies; the farthest one is the best guess
+    return hops[-1]
+
+class AdmissionController:
+    """Turns auth requests away before they cost a bcrypt hash.
+
+    A request must get a token from its client IP's bucket and from its
+    account's bucket, and is refused while the password service already has
+    PASSWORD_MAX_PENDING hashes in flight. Anything over a limit gets an
+    immediate 429 and is counted by reason; no thread waits for a turn.
+    """
+
+    def __init__(self):
+        self.by_ip = TokenBuckets('AUTH_IP_RATE', 'AUTH_IP_BURST')
+        self.by_account = TokenBuckets('AUTH_ACCOUNT_RATE', 'AUTH_ACCOUNT_BURST')
+        self._lock = threading.Lock()
+        self.counters = {'admitted': 0, 'rejected_ip': 0, 'rejected_account': 0, 'rejected_busy': 0}
+
+    def limit(self, account_field):
+        """Decorate an auth view; account_field names the JSON field with the account."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                data = request.get_json(silent=True)
+                account = data.get(account_field) if isinstance(data, dict) else None
+                ip = client_ip(request.remote_addr, ', '.join(request.headers.getlist('X-Forwarded-For')),
+                               parse_networks(settings.AUTH_TRUSTED_PROXIES))
+                rejection = self._admit(ip, account)
+                if rejection:
+                    return rejection
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counters,
+                tracked_ips=len(self.by_ip),
+                tracked_accounts=len(self.by_account),
+                hashing=passwords.stats()
+            )
+
+    def _admit(self, ip, account):
+        wait = self.by_ip.take(ip or 'unknown')
+        if wait:
+            return self._reject('rejected_ip', "Too many attempts from this address", wait)
+        if isinstance(account, str) and account:
+            wait = self.by_account.take(account.strip().lower())
+            if wait:
+                return self._reject('rejected_account', "Too many attempts for this account", wait)
+        if passwords.saturated():
+            return self._reject('rejected_busy', "Too many logins in progress", 1)
+        with self._lock:
+            self.counters['admitted'] += 1
+        return None
+
+    def _reject(self, reason, message, wait):
+        with self._lock:
+            self.counters[reason] += 1
+        retry_after = str(max(1, math.ceil(min(wait, 3600))))
+        return jsonify({"message": message}), 429, {"Retry-After": retry_after}
+
+auth_admission = AdmissionController()
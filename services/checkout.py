@@ -0,0 +1,60 @@
+from sqlalchemy import insert
+
+from models.cart_item import CartItem
+from models.order import Order
+from models.order_item import OrderItem
+from services.inventory import InsufficientStock, StockConflict, claim_stock, run_with_retries
+from services.sales import record_sale, stored_price
+
+def place_order(session, user_id, lines, cart_id=None, strategy=None, **order_fields):
+    """Turn cart lines into an order in a single transaction.
+
+    ``lines`` are dicts with product_id, quantity and price. Stock comes from
+    the user's live reservations first and the rest is taken with the
+    configured strategy (see services/inventory.py), so two buyers can never
+    both take the last unit. If any product is short, everything is rolled
+    back and InsufficientStock lists the short items. The store's daily
+    sales rollups are updated in the same transaction. The number of round
+    trips does not depend on the number of lines.
+    """
+    # The price as order_items stores it, for the items, the total and the rollups
+    lines = [dict(line, price=stored_price(line['price'])) for line in lines]
+    quantities = {}
+    for line in lines:
+        quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+
+    if 'total_price' not in order_fields:
+        order_fields['total_price'] = sum(line['quantity'] * line['price'] for line in lines)
+
+    def work():
+        try:
+            claim_stock(session, user_id, quantities, strategy)
+        except InsufficientStock:
+            session.rollback()
+            raise
+
+        order = Order(user_id=user_id, **order_fields)
+        session.add(order)
+        session.flush()  # Flush to get the order ID
+
+        if lines:
+            session.execute(insert(OrderItem), [{
+                'order_id': order.id,
+                'product_id': line['product_id'],
+                'quantity': line['quantity'],
+                'price': line['price']
+            } for line in lines])
+
+        # Seller dashboard totals move with the order or not at all
+        record_sale(session, order, lines)
+
+        # Clear the user's cart
+        if cart_id is not None:
+            session.query(CartItem).filter_by(cart_id=cart_id).delete()
+        else:
+            session.query(CartItem).filter_by(user_id=user_id).delete()
+
+        session.commit()
+        return order
+
+    return run_with_retries(session, work)
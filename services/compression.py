@@ -0,0 +1,121 @@
+import zlib
+
+from flask import request
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone works without it
+    brotli = None
+
+# Only text formats shrink; images and archives are already compressed
+COMPRESS_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/plain',
+    'text/html',
+    'text/css',
+    'text/csv',
+}
+
+class Compressor:
+    """One response's worth of gzip or brotli, fed chunk by chunk."""
+
+    def __init__(self, encoding, level=None):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=settings.COMPRESS_BROTLI_QUALITY if level is None else level)
+        else:
+            # wbits 16 + MAX_WBITS writes the gzip header and trailer
+            self._zlib = zlib.compressobj(settings.COMPRESS_LEVEL if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        # Push out what has been compressed so far, so a streaming client
+        # can use each chunk as it arrives
+        if self.encoding == 'br':
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+def available_encodings():
+    return [name for name in settings.COMPRESS_ENCODINGS if name == 'gzip' or (name == 'br' and brotli is not None)]
+
+def choose_encoding(accept_encodings, offered=None):
+    """The best encoding the client accepts, or None for identity."""
+    best, best_quality = None, 0
+    for name in available_encodings() if offered is None else offered:
+        quality = accept_encodings.quality(name)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+def compress_body(data, encoding, level=None):
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+def compress_chunks(chunks, encoding, level=None):
+    compressor = Compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Lets the wrapped stream_with_context generator close its request
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if request.method == 'HEAD' or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if 'no-transform' in response.cache_control:
+        return False
+    return response.mimetype in COMPRESS_MIMETYPES
+
+def compress_response(response):
+    """after_request hook: gzip or brotli the body if the client takes it."""
+    if not compressible(response):
+        return response
+    # Caches must keep the compressed and plain copies apart
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Size unknown up front, so streams are always compressed
+        response.response = compress_chunks(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < settings.COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress_body(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names exact bytes, which just changed
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,64 @@
+import hashlib
+from datetime import datetime, timezone
+
+from flask import make_response, request
+
+def make_etag(rows):
+    # rows are the cheap per-row fingerprints of a response, e.g.
+    # (id, version); any write to a row, its stock or its rating bumps version.
+    return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()[:32]
+
+def as_utc(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # SQLite hands server-side timestamps back as text
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def latest(values):
+    values = [as_utc(value) for value in values if value is not None]
+    return max(values) if values else None
+
+def validators(rows):
+    """ETag and Last-Modified for rows of (id, version, updated_at)."""
+    return make_etag([(row[0], row[1]) for row in rows]), latest(row[2] for row in rows)
+
+def list_validators(rows):
+    """ETag alone for the rows of (id, version) of a list.
+
+    A list has no honest Last-Modified: deleting one of its rows leaves the
+    newest updated_at as it was, and HTTP dates only have whole seconds.
+    The ETag changes with either, so lists send only that.
+    """
+    return make_etag([(row[0], row[1]) for row in rows]), None
+
+def is_not_modified(etag, last_modified=None):
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since (RFC 9110)
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def conditional_response(etag, last_modified, build, private=False):
+    """Answer 304 when the client's copy is current, else build() the body.
+
+    etag and last_modified come from a cheap version query, so a 304 never
+    loads or serializes the full result. build returns anything a view may
+    return; non-200 answers (404s, errors) go out without validators.
+    """
+    cache_control = 'private, no-cache' if private else 'no-cache'
+    if is_not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
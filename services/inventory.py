@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import case
+
+from config import settings
+from models.products import Products
+from models.reservation import StockReservation
+
+# How stock is taken from products, per deployment (STOCK_STRATEGY):
+#   atomic      - one conditional UPDATE ... WHERE stock_quantity >= :qty for the cart
+#   pessimistic - SELECT ... FOR UPDATE the product rows, check, then UPDATE
+#   optimistic  - read stock and version, then UPDATE ... WHERE version = :version
+#                 and retry the transaction when another buyer got there first
+# Every strategy bumps version, so optimistic buyers also notice the others.
+# Each takes the whole cart in a single UPDATE with a CASE per product, like
+# product_updates.apply_patches: executemany would send mysql-connector one
+# UPDATE per row.
+
+products = Products.__table__
+
+class InsufficientStock(Exception):
+    def __init__(self, items):
+        super().__init__("Insufficient stock")
+        self.items = items
+
+class StockConflict(Exception):
+    pass
+
+def short_items(quantities, stock):
+    return [{
+        'product_id': product_id,
+        'requested': quantity,
+        'available': stock.get(product_id, 0)
+    } for product_id, quantity in quantities.items() if stock.get(product_id, 0) < quantity]
+
+def current_stock(session, product_ids, for_update=False):
+    query = session.query(Products.id, Products.stock_quantity) \
+        .filter(Products.id.in_(list(product_ids))) \
+        .order_by(Products.id)  # Lock rows in a fixed order to avoid deadlocks
+    if for_update:
+        query = query.with_for_update()
+    return dict(query.all())
+
+def per_product(values):
+    # CASE id WHEN :id THEN :value ... END
+    return case(values, value=products.c.id)
+
+def adjust_stock(quantities, take=True):
+    # Takes (or gives back) each product's quantity; the strategies add
+    # their own condition to the WHERE clause
+    change = per_product(quantities)
+    stock = products.c.stock_quantity - change if take else products.c.stock_quantity + change
+    return products.update() \
+        .where(products.c.id.in_(list(quantities))) \
+        .values(stock_quantity=stock, version=products.c.version + 1)
+
+def take_stock_atomic(session, quantities):
+    decrement = adjust_stock(quantities).where(products.c.stock_quantity >= per_product(quantities))
+    result = session.connection().execute(decrement)
+
+    if result.rowcount != len(quantities):
+        session.rollback()
+        raise InsufficientStock(short_items(quantities, current_stock(session, quantities)))
+
+def take_stock_pessimistic(session, quantities):
+    stock = current_stock(session, quantities, for_update=True)
+    short = short_items(quantities, stock)
+    if short:
+        raise InsufficientStock(short)
+
+    # The stock check in the WHERE clause is a safety net for databases
+    # without row locks (SQLite ignores FOR UPDATE)
+    decrement = adjust_stock(quantities).where(products.c.stock_quantity >= per_product(quantities))
+    result = session.connection().execute(decrement)
+
+    if result.rowcount != len(quantities):
+        session.rollback()
+        raise InsufficientStock(short_items(quantities, current_stock(session, quantities)))
+
+def take_stock_optimistic(session, quantities):
+    rows = session.query(Products.id, Products.stock_quantity, Products.version) \
+        .filter(Products.id.in_(list(quantities))) \
+        .all()
+    short = short_items(quantities, {row.id: row.stock_quantity for row in rows})
+    if short:
+        raise InsufficientStock(short)
+
+    seen = per_product({row.id: row.version for row in rows})
+    result = session.connection().execute(adjust_stock(quantities).where(products.c.version == seen))
+
+    if result.rowcount != len(quantities):
+        raise StockConflict()
+
+STRATEGIES = {
+    'atomic': take_stock_atomic,
+    'pessimistic': take_stock_pessimistic,
+    'optimistic': take_stock_optimistic,
+}
+
+def take_stock(session, quantities, strategy=None):
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if quantities:
+        STRATEGIES[strategy or settings.STOCK_STRATEGY](session, quantities)
+
+def return_stock(session, quantities):
+    if not quantities:
+        return
+    session.connection().execute(adjust_stock(quantities, take=False))
+
+def run_with_retries(session, work):
+    # A stock conflict means the snapshot we read is stale, so start the whole
+    # transaction again rather than just the UPDATE.
+    for attempt in range(settings.STOCK_RETRIES):
+        try:
+            return work()
+        except StockConflict:
+            session.rollback()
+    raise StockConflict()
+
+def sum_by_product(reservations):
+    quantities = {}
+    for reservation in reservations:
+        quantities[reservation.product_id] = quantities.get(reservation.product_id, 0) + reservation.quantity
+    return quantities
+
+def expire_reservations(session, product_ids=None, now=None):
+    now = now or datetime.utcnow()
+    query = session.query(StockReservation).filter(
+        StockReservation.status == 'active',
+        StockReservation.expires_at <= now
+    )
+    if product_ids is not None:
+        query = query.filter(StockReservation.product_id.in_(list(product_ids)))
+
+    # Skip rows another worker is already expiring or confirming
+    expired = query.with_for_update(skip_locked=True).all()
+    for reservation in expired:
+        reservation.status = 'expired'
+    return_stock(session, sum_by_product(expired))
+    session.flush()
+    return len(expired)
+
+def active_reservations(session, user_id, product_ids=None):
+    query = session.query(StockReservation).filter(
+        StockReservation.user_id == user_id,
+        StockReservation.status == 'active'
+    )
+    if product_ids is not None:
+        query = query.filter(StockReservation.product_id.in_(list(product_ids)))
+    return query.with_for_update().all()
+
+def release_reservations(session, user_id, product_ids=None):
+    reservations = active_reservations(session, user_id, product_ids)
+    for reservation in reservations:
+        reservation.status = 'released'
+    return_stock(session, sum_by_product(reservations))
+    session.flush()
+    return len(reservations)
+
+def reserve(session, user_id, quantities, ttl=None, strategy=None):
+    """Hold stock for a user until checkout or until the TTL runs out.
+
+    The units are taken out of stock_quantity straight away, so other buyers
+    cannot sell them, and go back when the reservation is released or
+    expires. Reserving again replaces the user's earlier reservations for
+    the same products. The caller commits.
+    """
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl or settings.STOCK_RESERVATION_TTL)
+    expire_reservations(session, quantities)
+    release_reservations(session, user_id, quantities)
+    take_stock(session, quantities, strategy)
+
+    reservations = [StockReservation(
+        product_id=product_id,
+        user_id=user_id,
+        quantity=quantity,
+        expires_at=expires_at
+    ) for product_id, quantity in quantities.items()]
+    session.add_all(reservations)
+    session.flush()
+    return reservations
+
+def claim_stock(session, user_id, quantities, strategy=None):
+    """Take stock for a checkout, using the user's live reservations first.
+
+    Reserved units are already out of stock, so only the part of each line
+    that is not covered by a reservation is taken with the configured
+    strategy. Reserved units the order does not need go back to stock.
+    """
+    expire_reservations(session, quantities)
+    reservations = active_reservations(session, user_id, quantities)
+    reserved = sum_by_product(reservations)
+    for reservation in reservations:
+        reservation.status = 'confirmed'
+
+    surplus = {}
+    remaining = {}
+    for product_id, quantity in quantities.items():
+        held = reserved.get(product_id, 0)
+        if held > quantity:
+            surplus[product_id] = held - quantity
+        remaining[product_id] = max(quantity - held, 0)
+
+    return_stock(session, surplus)
+    take_stock(session, remaining, strategy)
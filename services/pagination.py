@@ -0,0 +1,69 @@
+import base64
+import json
+
+from config import settings
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, dict):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def get_page_size(requested):
+    if not requested or requested < 1:
+        return settings.DEFAULT_PAGE_SIZE
+    return min(requested, settings.MAX_PAGE_SIZE)
+
+def page_query(query, id_column, cursor, page_size, descending=False):
+    # Keyset pagination on an increasing primary key: each page starts right
+    # after the last id of the previous one, so page 1000 costs the same as
+    # page 1 and rows inserted meanwhile never shift the pages after it.
+    # One extra row tells whether there is a next page.
+    after = decode_cursor(cursor)
+    if after is not None:
+        if not isinstance(after.get('id'), int):
+            raise InvalidCursor("Invalid cursor")
+        if descending:
+            query = query.filter(id_column < after['id'])
+        else:
+            query = query.filter(id_column > after['id'])
+
+    order = id_column.desc() if descending else id_column
+    return query.order_by(order).limit(page_size + 1)
+
+def batches_by_id(query, id_column, batch_size):
+    # The same keyset walk over the whole result, one query per batch, so only
+    # a batch is ever held in memory. mysql-connector buffers every result it
+    # fetches, so one big query with a cursor would load all of it at once.
+    last_id = None
+    while True:
+        batch = query if last_id is None else query.filter(id_column > last_id)
+        rows = batch.order_by(id_column).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+def paginate_by_id(query, id_column, cursor, page_size, descending=False):
+    rows = page_query(query, id_column, cursor, page_size, descending).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor({'id': rows[-1].id})
+    return rows, next_cursor
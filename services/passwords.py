@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from config import settings
+
+class PasswordServiceBusy(Exception):
+    pass
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _verify(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def hash_rounds(hashed):
+    # Hashes look like $2b$12$<salt and digest>
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt in a pool of worker processes.
+
+    A hash takes a few hundred milliseconds of CPU, which would otherwise
+    hold a request thread (and the GIL) for that long. At most
+    PASSWORD_MAX_PENDING hashes run or wait at once, also when hashing on the
+    request thread; past that callers get PasswordServiceBusy at once rather
+    than waiting for a turn. Auth admission checks saturated() first, so
+    most of them are turned away before any database or hashing work.
+
+    Workers are spawned, not forked, so they re-import the main module;
+    scripts that log users in need an ``if __name__ == '__main__'`` guard.
+    """
+
+    def __init__(self):
+        self.after_fork()
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), settings.BCRYPT_ROUNDS).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._run(_verify, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != settings.BCRYPT_ROUNDS
+
+    def after_fork(self):
+        # The pool's processes belong to the parent; start new ones on demand
+        self._pool = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.busy = 0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, because forking a threaded web worker is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def saturated(self):
+        # A snapshot without the lock; _run makes the binding check
+        return self.in_flight >= settings.PASSWORD_MAX_PENDING
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'max_pending': settings.PASSWORD_MAX_PENDING, 'busy': self.busy}
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= settings.PASSWORD_MAX_PENDING:
+                self.busy += 1
+                raise PasswordServiceBusy("Too many logins in progress")
+            self.in_flight += 1
+        try:
+            if settings.PASSWORD_WORKERS <= 0:
+                return fn(*args)
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died; the next call starts a fresh pool
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+passwords = PasswordHasher()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=passwords.after_fork)
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession, object_session
+
+from config import settings
+from connectors.mysql_connector import Session
+from models.users import User
+from models.stores import Stores
+
+MODELS = {'user': User, 'store': Stores}
+NOT_FOUND = {'user': "User not found", 'store': "Store not found"}
+
+MISSING = object()
+
+class TTLCache:
+    """A small thread-safe LRU whose entries also expire after ttl seconds.
+
+    ttl and max_size are named by the settings that hold them.
+    """
+
+    def __init__(self, ttl_setting, size_setting):
+        self.ttl_setting = ttl_setting
+        self.size_setting = size_setting
+        self._entries = OrderedDict()  # key -> (monotonic expiry, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, self.ttl_setting)
+
+    @property
+    def max_size(self):
+        return getattr(settings, self.size_setting)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class PrincipalCache(TTLCache):
+    """Remembers which user and store ids exist, for a while.
+
+    The JWT signature already proves who is calling; the only question left
+    is whether the account still exists. A hit answers that without a query.
+    Deleting an account through the ORM forgets its id in this worker, and
+    other workers stop trusting it after the TTL.
+    """
+
+    def __init__(self):
+        super().__init__('PRINCIPAL_CACHE_TTL', 'PRINCIPAL_CACHE_SIZE')
+
+    def resolve(self, session, kind, principal_id):
+        """Return principal_id if that account exists, else None."""
+        try:
+            principal_id = int(principal_id)
+        except (TypeError, ValueError):
+            return None
+
+        if self.get((kind, principal_id)) is not MISSING:
+            return principal_id
+
+        model = MODELS[kind]
+        if session.query(model.id).filter(model.id == principal_id).first() is None:
+            return None
+        self.put((kind, principal_id), True)
+        return principal_id
+
+    def forget(self, kind, principal_id):
+        self.pop((kind, principal_id))
+
+principals = PrincipalCache()
+
+def with_principal(kind, arg=None):
+    """Pass the caller's id to the view as ``<kind>_id``, or answer 404.
+
+    Goes under @jwt_required(), e.g.
+
+        @jwt_required()
+        @with_principal('user')
+        def get_orders(user_id): ...
+    """
+    arg = arg or f'{kind}_id'
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            principal_id = principals.resolve(Session(), kind, get_jwt_identity())
+            if principal_id is None:
+                return jsonify({"message": NOT_FOUND[kind]}), 404
+            kwargs[arg] = principal_id
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Loaded accounts for Flask-Login, keyed by (kind, id). The instances are
+# detached, so only their columns can be read, not lazy relationships.
+login_accounts = TTLCache('PRINCIPAL_CACHE_TTL', 'LOGIN_CACHE_SIZE')
+
+def parse_login_id(login_id):
+    # "user:12" or "store:7"; a bare id is a user, as the old loader assumed
+    kind, _, raw_id = str(login_id).rpartition(':')
+    kind = kind or 'user'
+    if kind not in MODELS:
+        return None
+    try:
+        return kind, int(raw_id)
+    except ValueError:
+        return None
+
+def load_login(login_id):
+    key = parse_login_id(login_id)
+    if key is None:
+        return None
+
+    account = login_accounts.get(key)
+    if account is not MISSING:
+        return account
+
+    # Own short-lived session, so closing it cannot touch the request's
+    s = Session.session_factory()
+    try:
+        account = s.get(MODELS[key[0]], key[1])
+        if account is not None:
+            s.expunge(account)
+    finally:
+        s.close()
+
+    if account is not None:
+        login_accounts.put(key, account)
+    return account
+
+def forget_login(kind, account_id):
+    login_accounts.pop((kind, account_id))
+
+def forget_updated(kind, target):
+    forget_login(kind, target.id)
+    # Again after the commit, in case a request cached the old row meanwhile
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('updated_logins', set()).add((kind, target.id))
+
+# Profile updates and deletions anywhere in this worker drop the cached
+# copies. Bulk Query.update()/delete() bypass these; the TTL covers them.
+@event.listens_for(User, 'after_update')
+def forget_updated_user(mapper, connection, target):
+    forget_updated('user', target)
+
+@event.listens_for(Stores, 'after_update')
+def forget_updated_store(mapper, connection, target):
+    forget_updated('store', target)
+
+@event.listens_for(OrmSession, 'after_commit')
+def forget_committed(session):
+    for kind, account_id in session.info.pop('updated_logins', ()):
+        forget_login(kind, account_id)
+
+@event.listens_for(OrmSession, 'after_rollback')
+def discard_updated(session):
+    session.info.pop('updated_logins', None)
+
+@event.listens_for(User, 'after_delete')
+def forget_user(mapper, connection, target):
+    principals.forget('user', target.id)
+    forget_login('user', target.id)
+
+@event.listens_for(Stores, 'after_delete')
+def forget_store(mapper, connection, target):
+    principals.forget('store', target.id)
+    forget_login('store', target.id)
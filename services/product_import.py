@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import math
+from decimal import Decimal, InvalidOperation
+
+from config import settings
+from models.products import Products
+
+products = Products.__table__
+
+class InvalidProduct(ValueError):
+    pass
+
+def is_finite(number):
+    # math.isfinite() raises on a signaling NaN, so Decimals check themselves
+    return number.is_finite() if isinstance(number, Decimal) else math.isfinite(number)
+
+def check_fields(data):
+    """Check whichever product fields are present, as POST /products does."""
+    if 'name' in data and (not isinstance(data['name'], str) or len(data['name']) > 100):
+        raise InvalidProduct("'name' must be a string with a maximum length of 100 characters")
+    if 'description' in data and not isinstance(data['description'], str):
+        raise InvalidProduct("'description' must be a string")
+    # bool is an int in Python, but true is not a price or a quantity
+    if 'price' in data and (isinstance(data['price'], bool) or not isinstance(data['price'], (int, float, Decimal))
+                            or not is_finite(data['price'])):
+        raise InvalidProduct("'price' must be a number")
+    if 'stock_quantity' in data and (isinstance(data['stock_quantity'], bool) or not isinstance(data['stock_quantity'], int)):
+        raise InvalidProduct("'stock_quantity' must be an integer")
+
+    if 'image_url' in data and (not isinstance(data['image_url'], str) or len(data['image_url']) > 255):
+        raise InvalidProduct("'image_url' must be a string with a maximum length of 255 characters")
+    if 'location' in data and (not isinstance(data['location'], str) or len(data['location']) > 255):
+        raise InvalidProduct("'location' must be a string with a maximum length of 255 characters")
+
+def validate_product(data):
+    """Check a new product the way POST /products does.
+
+    Returns the column values to insert, or raises InvalidProduct with the
+    message the endpoint reports.
+    """
+    for field in ['name', 'price', 'stock_quantity']:
+        if field not in data:
+            raise InvalidProduct(f"'{field}' is a required field")
+    check_fields(data)
+
+    return {
+        'name': data['name'],
+        'description': data.get('description', ''),
+        'price': data['price'],
+        'stock_quantity': data['stock_quantity'],
+        'image_url': data.get('image_url', ''),
+        'location': data.get('location', '')
+    }
+
+def import_format(content_type, requested=None):
+    requested = (requested or '').lower()
+    if requested in ('csv', 'ndjson'):
+        return requested
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+def csv_value(field, value):
+    # Everything in a CSV is text; turn numbers back into numbers so the
+    # same checks apply as for JSON, and leave bad values for them to reject.
+    if value is None:
+        return value
+    if field == 'price':
+        try:
+            return Decimal(value.strip())
+        except InvalidOperation:
+            return value
+    if field == 'stock_quantity':
+        try:
+            return int(value.strip())
+        except ValueError:
+            return value
+    return value
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict or None, error) one row at a time."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, {field: csv_value(field, value) for field, value in row.items()
+                           if field is not None and value != ''}, None
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Each line must be a JSON object"
+            continue
+        yield number, row, None
+
+def import_products(session, store_id, rows, search_index=None, batch_size=None):
+    """Insert valid rows in batches and yield progress events as dicts.
+
+    Each batch is one executemany INSERT and one commit, so only a batch of
+    rows is ever held in memory and a failure later in the file keeps what
+    was imported before it.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    counts = {'rows': 0, 'imported': 0, 'failed': 0}
+    batch = []
+    # Imported products are found again by id to add them to the search index
+    last_id = session.query(Products.id).filter(Products.store_id == store_id) \
+        .order_by(Products.id.desc()).limit(1).scalar() or 0
+
+    def flush():
+        nonlocal last_id
+        session.connection().execute(products.insert(), batch)
+        session.commit()
+        counts['imported'] += len(batch)
+        batch.clear()
+        if search_index is not None:
+            imported = session.query(Products) \
+                .filter(Products.store_id == store_id, Products.id > last_id) \
+                .order_by(Products.id)
+            for product in imported:
+                search_index.add(product)
+                last_id = product.id
+            session.expunge_all()
+        return dict(counts, event='progress')
+
+    for number, row, error in rows:
+        counts['rows'] += 1
+        if error is None:
+            try:
+                values = validate_product(row)
+            except InvalidProduct as e:
+                error = str(e)
+        if error is not None:
+            counts['failed'] += 1
+            # Past IMPORT_MAX_ERRORS only the count goes up
+            if counts['failed'] <= settings.IMPORT_MAX_ERRORS:
+                yield {'event': 'error', 'row': number, 'message': error}
+            continue
+
+        values['store_id'] = store_id
+        batch.append(values)
+        if len(batch) >= batch_size:
+            yield flush()
+
+    if batch:
+        yield flush()
+    yield dict(counts, event='done')
@@ -0,0 +1,61 @@
+from models.products import Products
+from models.ratings import ProductRating, rating_columns, rating_from_row
+
+# Read-only column queries for the listing endpoints. They return plain
+# Row tuples: no entities are built, nothing enters the identity map and
+# nothing is checked for changes at flush, and only the listed columns come
+# over the wire. Rows serialize as objects keyed by column name (see
+# services/json_provider.py), so most go straight into the response.
+
+# What Products.to_dict() returns
+PRODUCT_COLUMNS = (
+    Products.id,
+    Products.name,
+    Products.description,
+    Products.price,
+    Products.stock_quantity,
+    Products.image_url,
+    Products.location,
+    Products.featured,
+    Products.store_id,
+)
+
+# GET /products, see list_item
+LIST_COLUMNS = (
+    Products.id,
+    Products.name,
+    Products.price,
+    Products.stock_quantity.label('stock'),
+    Products.store_id,
+    Products.image_url,
+    Products.location,
+    *rating_columns(ProductRating),
+)
+
+# GET /store/products_overview
+OVERVIEW_COLUMNS = (
+    Products.id,
+    Products.name,
+    Products.price,
+    Products.stock_quantity,
+)
+
+def product_rows(session, columns=PRODUCT_COLUMNS):
+    return session.query(*columns).select_from(Products)
+
+def catalog_rows(session):
+    # Products nobody has rated have no totals row, hence the outer join
+    return session.query(*LIST_COLUMNS).select_from(Products) \
+        .outerjoin(ProductRating, ProductRating.product_id == Products.id)
+
+def list_item(row):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "price": row.price,
+        "stock": row.stock,
+        "store_id": row.store_id,
+        "image_url": row.image_url,
+        "location": row.location,
+        "rating": rating_from_row(row)
+    }
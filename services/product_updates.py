@@ -0,0 +1,73 @@
+from sqlalchemy import case
+
+from config import settings
+from models.products import Products
+from services.product_import import InvalidProduct, check_fields
+
+PATCH_FIELDS = ['name', 'description', 'price', 'stock_quantity', 'image_url', 'location']
+
+products = Products.__table__
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def parse_patches(items):
+    """Turn [{id, price, ...}, ...] into {id: {field: value}}.
+
+    Returns the patches and a list of {index, message} errors. Later patches
+    for the same id win field by field.
+    """
+    patches = {}
+    errors = []
+    if not isinstance(items, list) or not items:
+        return patches, [{"index": None, "message": "Send a non-empty list of product patches"}]
+    if len(items) > settings.BULK_UPDATE_MAX:
+        return patches, [{"index": None, "message": f"At most {settings.BULK_UPDATE_MAX} patches per request"}]
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or isinstance(item.get('id'), bool) or not isinstance(item.get('id'), int):
+            errors.append({"index": index, "message": "'id' must be an integer"})
+            continue
+        fields = {field: item[field] for field in PATCH_FIELDS if field in item}
+        if not fields:
+            errors.append({"index": index, "message": "Nothing to update"})
+            continue
+        try:
+            check_fields(fields)
+        except InvalidProduct as e:
+            errors.append({"index": index, "message": str(e)})
+            continue
+        patches.setdefault(item['id'], {}).update(fields)
+    return patches, errors
+
+def apply_patches(session, store_id, patches, chunk_size=None):
+    """Apply patches to the store's own products. The caller commits.
+
+    Each chunk of products is one UPDATE with a CASE per changed column, so
+    a few thousand patches take a handful of statements. Returns the ids
+    that were updated and the ids that are not this store's products.
+    """
+    chunk_size = chunk_size or settings.BULK_UPDATE_CHUNK
+    ids = list(patches)
+    owned = set()
+    for chunk in chunked(ids, chunk_size):
+        rows = session.query(Products.id).filter(Products.id.in_(chunk), Products.store_id == store_id)
+        owned.update(product_id for (product_id,) in rows)
+    updated = [product_id for product_id in ids if product_id in owned]
+    missing = [product_id for product_id in ids if product_id not in owned]
+
+    for chunk in chunked(updated, chunk_size):
+        values = {}
+        for field in PATCH_FIELDS:
+            changes = {product_id: patches[product_id][field] for product_id in chunk if field in patches[product_id]}
+            if changes:
+                values[field] = case(changes, value=products.c.id, else_=products.c[field])
+        # Counts as a write for optimistic checkouts that read the old stock
+        values['version'] = products.c.version + 1
+        session.connection().execute(
+            products.update()
+                .where(products.c.id.in_(chunk), products.c.store_id == store_id)
+                .values(**values)
+        )
+    return updated, missing
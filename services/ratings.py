@@ -0,0 +1,93 @@
+from sqlalchemy import case, delete, func, select
+
+from models.feedback import Feedback
+from models.order_item import OrderItem
+from models.products import Products
+from models.stores import Stores
+from models.ratings import ProductRating, StoreRating, STARS
+from services.product_updates import chunked
+from services.sales import upsert_increments
+
+product_ratings = ProductRating.__table__
+store_ratings = StoreRating.__table__
+products = Products.__table__
+stores = Stores.__table__
+
+COLUMNS = ['count', 'total'] + [f'stars_{stars}' for stars in STARS]
+
+def rating_increment(rating):
+    row = {'count': 1, 'total': rating}
+    row.update({f'stars_{stars}': int(stars == rating) for stars in STARS})
+    return row
+
+def record_rating(session, order_id, rating):
+    """Count a rating for every product and store in the order.
+
+    Runs in the same transaction as the feedback insert. A product that is
+    on several lines of the order is still counted once. The rated products
+    and stores get a new version too, so cached pages showing the old rating
+    stop validating. The caller commits.
+    """
+    rated = session.query(OrderItem.product_id, Products.store_id) \
+        .join(Products, Products.id == OrderItem.product_id) \
+        .filter(OrderItem.order_id == order_id) \
+        .distinct() \
+        .all()
+
+    product_ids = sorted({row.product_id for row in rated})
+    store_ids = sorted({row.store_id for row in rated})
+    product_rows = [dict(rating_increment(rating), product_id=product_id) for product_id in product_ids]
+    store_rows = [dict(rating_increment(rating), store_id=store_id) for store_id in store_ids]
+    upsert_increments(session, product_ratings, product_rows, ['product_id'], COLUMNS)
+    upsert_increments(session, store_ratings, store_rows, ['store_id'], COLUMNS)
+
+    connection = session.connection()
+    if product_ids:
+        connection.execute(products.update().where(products.c.id.in_(product_ids)).values(version=products.c.version + 1))
+    if store_ids:
+        connection.execute(stores.update().where(stores.c.id.in_(store_ids)).values(version=stores.c.version + 1))
+
+def totals_from(rated, key):
+    # rated has one row per (feedback, key) pair, so duplicates within an
+    # order are already gone
+    return select(
+        rated.c[key],
+        func.count(),
+        func.sum(rated.c.rating),
+        *[func.sum(case((rated.c.rating == stars, 1), else_=0)) for stars in STARS]
+    ).group_by(rated.c[key])
+
+def current_totals(connection, table, key):
+    rows = connection.execute(select(table.c[key], *[table.c[column] for column in COLUMNS]))
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+def changed_keys(before, after):
+    return sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+
+def bump_versions(connection, table, ids):
+    # Chunked so a large rebuild does not send one huge IN list
+    for chunk in chunked(ids, 500):
+        connection.execute(table.update().where(table.c.id.in_(chunk)).values(version=table.c.version + 1))
+
+def rebuild_ratings(session):
+    """Recompute every product and store rating from feedback. The caller commits.
+
+    Only products and stores whose totals came out different get a new
+    version, so a rebuild that fixes nothing leaves every ETag valid.
+    """
+    rated_items = select(Feedback.id, Feedback.rating, OrderItem.product_id, Products.store_id) \
+        .join(OrderItem, OrderItem.order_id == Feedback.order_id) \
+        .join(Products, Products.id == OrderItem.product_id)
+    by_product = rated_items.with_only_columns(Feedback.id, Feedback.rating, OrderItem.product_id).distinct().subquery()
+    by_store = rated_items.with_only_columns(Feedback.id, Feedback.rating, Products.store_id).distinct().subquery()
+
+    connection = session.connection()
+    old_products = current_totals(connection, product_ratings, 'product_id')
+    old_stores = current_totals(connection, store_ratings, 'store_id')
+    connection.execute(delete(product_ratings))
+    connection.execute(delete(store_ratings))
+    connection.execute(product_ratings.insert().from_select(['product_id'] + COLUMNS, totals_from(by_product, 'product_id')))
+    connection.execute(store_ratings.insert().from_select(['store_id'] + COLUMNS, totals_from(by_store, 'store_id')))
+
+    bump_versions(connection, products, changed_keys(old_products, current_totals(connection, product_ratings, 'product_id')))
+    bump_versions(connection, stores, changed_keys(old_stores, current_totals(connection, store_ratings, 'store_id')))
@@ -0,0 +1,122 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import func, select, delete
+
+from models.order import Order
+from models.order_item import OrderItem
+from models.products import Products
+from models.sales import StoreDailySales, ProductDailySales
+
+store_sales = StoreDailySales.__table__
+product_sales = ProductDailySales.__table__
+
+# One cent, the scale of order_items.price
+CENT = Decimal(1).scaleb(-OrderItem.price.type.scale)
+
+def stored_price(price):
+    """The price exactly as order_items keeps it.
+
+    Checkout stores this value and the rollups add it up, so rebuild_sales,
+    which sums order_items, gets the same revenue as the live updates.
+    """
+    return Decimal(str(price)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def upsert_increments(session, table, rows, keys, columns=('revenue', 'units', 'orders')):
+    """Add rows' counters onto existing rollup rows, inserting missing ones.
+
+    One INSERT ... ON DUPLICATE KEY UPDATE (MySQL) or ON CONFLICT DO UPDATE
+    (SQLite) for all rows, so the rollup changes atomically with the write
+    that caused it.
+    """
+    if not rows:
+        return
+    # Same key order in every transaction, so concurrent writers lock the
+    # rollup rows in the same order and cannot deadlock on them
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+    dialect = session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update(**{
+            column: table.c[column] + stmt.inserted[column] for column in columns
+        })
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={
+            column: table.c[column] + stmt.excluded[column] for column in columns
+        })
+    session.connection().execute(stmt, rows)
+
+def record_sale(session, order, lines):
+    """Add an order's lines to the daily rollups, inside the checkout transaction.
+
+    Line prices must already be stored_price() values, as place_order makes them.
+    """
+    if not lines:
+        return
+    day = (order.created_at or datetime.utcnow()).date()
+    product_ids = {line['product_id'] for line in lines}
+    stores = dict(session.query(Products.id, Products.store_id).filter(Products.id.in_(product_ids)).all())
+
+    by_product = {}
+    by_store = {}
+    for line in lines:
+        product_id = line['product_id']
+        store_id = stores.get(product_id)
+        if store_id is None:
+            continue
+        revenue = line['quantity'] * line['price']
+        product = by_product.setdefault(product_id, {
+            'product_id': product_id, 'store_id': store_id, 'day': day, 'revenue': 0, 'units': 0, 'orders': 1
+        })
+        product['revenue'] += revenue
+        product['units'] += line['quantity']
+        store = by_store.setdefault(store_id, {'store_id': store_id, 'day': day, 'revenue': 0, 'units': 0, 'orders': 1})
+        store['revenue'] += revenue
+        store['units'] += line['quantity']
+
+    upsert_increments(session, store_sales, list(by_store.values()), ['store_id', 'day'])
+    upsert_increments(session, product_sales, list(by_product.values()), ['product_id', 'day'])
+
+def rebuild_sales(session, date_from=None, date_to=None):
+    """Recompute the rollups from orders, for all days or a date range.
+
+    Replaces the rollup rows in the range with sums over order_items, in one
+    transaction. The caller commits.
+    """
+    day = func.date(Order.created_at)
+    revenue = func.sum(OrderItem.quantity * OrderItem.price)
+    units = func.sum(OrderItem.quantity)
+    orders = func.count(func.distinct(OrderItem.order_id))
+
+    source = select(OrderItem).join(Order, Order.id == OrderItem.order_id) \
+        .join(Products, Products.id == OrderItem.product_id)
+    clear_store = delete(store_sales)
+    clear_product = delete(product_sales)
+    if date_from:
+        source = source.where(day >= date_from)
+        clear_store = clear_store.where(store_sales.c.day >= date_from)
+        clear_product = clear_product.where(product_sales.c.day >= date_from)
+    if date_to:
+        source = source.where(day <= date_to)
+        clear_store = clear_store.where(store_sales.c.day <= date_to)
+        clear_product = clear_product.where(product_sales.c.day <= date_to)
+
+    connection = session.connection()
+    connection.execute(clear_store)
+    connection.execute(clear_product)
+    connection.execute(store_sales.insert().from_select(
+        ['store_id', 'day', 'revenue', 'units', 'orders'],
+        source.with_only_columns(Products.store_id, day, revenue, units, orders)
+            .group_by(Products.store_id, day)
+    ))
+    connection.execute(product_sales.insert().from_select(
+        ['product_id', 'store_id', 'day', 'revenue', 'units', 'orders'],
+        source.with_only_columns(OrderItem.product_id, Products.store_id, day, revenue, units, orders)
+            .group_by(OrderItem.product_id, Products.store_id, day)
+    ))
@@ -0,0 +1,203 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from config import settings
+from models.products import Products
+from services.product_reads import product_rows
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Matches in the product name count more than matches in the description
+FIELD_WEIGHTS = {'name': 2.0, 'description': 1.0}
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+def token_weights(data):
+    weights = defaultdict(float)
+    for field, field_weight in FIELD_WEIGHTS.items():
+        for token in tokenize(data.get(field)):
+            weights[token] += field_weight
+    return weights
+
+class ProductSearchIndex:
+    def __init__(self, refresh_interval=None):
+        self.refresh_interval = refresh_interval  # None for SEARCH_INDEX_REFRESH
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._tokens = []                   # sorted vocabulary for prefix lookups
+        self._docs = {}                     # product_id -> product dict
+        self._doc_tokens = {}               # product_id -> set of tokens
+        self._build_lock = threading.Lock()  # One build at a time per worker
+        self._pending = None                # Writes seen while a build runs
+
+    def build(self, session):
+        """Rebuild from the database; searches keep using the old index meanwhile.
+
+        The new index is built outside the lock and swapped in at once.
+        Writes that arrive while it is built are applied to the old index
+        and recorded, then replayed onto the new one before the swap, so
+        none of them is lost whether or not the query already saw it.
+        """
+        with self._build_lock:
+            self._build(session)
+
+    def _build(self, session):
+        # Callers hold _build_lock
+        with self._lock:
+            self._pending = []
+        try:
+            # Plain rows, the same keys as Products.to_dict()
+            products = product_rows(session).all()
+            postings = defaultdict(dict)
+            docs = {}
+            doc_tokens = {}
+            for product in products:
+                data = product._asdict()
+                weights = token_weights(data)
+                for token, weight in weights.items():
+                    postings[token][data['id']] = weight
+                docs[data['id']] = data
+                doc_tokens[data['id']] = set(weights)
+            # Sorted once, rather than insort per new token
+            tokens = sorted(postings)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._postings, self._tokens, self._docs, self._doc_tokens = postings, tokens, docs, doc_tokens
+            for product_id, data in self._pending:
+                self._unindex(product_id)
+                if data is not None:
+                    self._index(data)
+            self._pending = None
+            self.built_at = time.monotonic()
+        print(f"Search index built with {len(docs)} products")
+
+    def ensure_fresh(self, session):
+        if self.built_at is None:
+            # Nothing to answer from yet, so the first search waits for it
+            with self._build_lock:
+                if self.built_at is None:
+                    self._build(session)
+        else:
+            interval = settings.SEARCH_INDEX_REFRESH if self.refresh_interval is None else self.refresh_interval
+            if interval and time.monotonic() - self.built_at > interval:
+                self.refresh_in_background()
+
+    def refresh_in_background(self):
+        if self._build_lock.locked():
+            return
+        threading.Thread(target=self._refresh, name='search-index-refresh', daemon=True).start()
+
+    def _refresh(self):
+        from connectors.mysql_connector import Session
+
+        # Its own session; the request's belongs to the request thread
+        s = Session.session_factory()
+        try:
+            self.build(s)
+        except Exception as e:
+            print(f"Search index refresh failed: {e}")
+        finally:
+            s.close()
+
+    def add(self, product):
+        data = product.to_dict() if isinstance(product, Products) else product
+        with self._lock:
+            self._unindex(data['id'])
+            self._index(data)
+            if self._pending is not None:
+                self._pending.append((data['id'], data))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._unindex(product_id)
+            if self._pending is not None:
+                self._pending.append((product_id, None))
+
+    def search(self, keyword, location=None, limit=None):
+        terms = tokenize(keyword)
+        if not terms:
+            return []
+        limit = max(1, min(limit or settings.SEARCH_DEFAULT_LIMIT, settings.SEARCH_MAX_LIMIT))
+        location = location.lower() if location else None
+
+        with self._lock:
+            total_docs = len(self._docs) or 1
+            scores = None
+            # Every term has to match; the last one is treated as a prefix so
+            # partially typed words still find results.
+            for position, term in enumerate(terms):
+                if position == len(terms) - 1:
+                    matches = self._prefix_matches(term)
+                else:
+                    matches = [term] if term in self._postings else []
+
+                term_scores = {}
+                for token in matches:
+                    postings = self._postings[token]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for product_id, weight in postings.items():
+                        term_scores[product_id] = term_scores.get(product_id, 0) + weight * idf
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+
+            if location:
+                scores = {pid: score for pid, score in scores.items()
+                          if location in (self._docs[pid]['location'] or '').lower()}
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [self._docs[pid] for pid, _ in top]
+
+    def _prefix_matches(self, prefix):
+        start = bisect.bisect_left(self._tokens, prefix)
+        matches = []
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def _index(self, data):
+        product_id = data['id']
+        weights = token_weights(data)
+
+        for token, weight in weights.items():
+            postings = self._postings[token]
+            if not postings:
+                bisect.insort(self._tokens, token)
+            postings[product_id] = weight
+
+        self._docs[product_id] = data
+        self._doc_tokens[product_id] = set(weights)
+
+    def _unindex(self, product_id):
+        self._docs.pop(product_id, None)
+        for token in self._doc_tokens.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._tokens, token)
+                if index < len(self._tokens) and self._tokens[index] == token:
+                    self._tokens.pop(index)
+
+search_index = ProductSearchIndex()
@@ -0,0 +1,49 @@
+from flask import Response, current_app, request, stream_with_context
+
+from config import settings
+from services.pagination import batches_by_id
+
+def stream_format():
+    # ?stream=ndjson (or an ndjson Accept header) streams one object per line,
+    # ?stream=1 / ?stream=json streams a regular JSON array.
+    mode = (request.args.get('stream') or '').lower()
+    if mode == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return 'ndjson'
+    if mode in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+def stream_rows(rows, serialize, fmt, batch_size=None):
+    dumps = current_app.json.dumps
+    batch_size = batch_size or settings.STREAM_BATCH_SIZE
+
+    def generate():
+        chunk = []
+        first = True
+        if fmt != 'ndjson':
+            yield '['
+        for row in rows:
+            if fmt == 'ndjson':
+                chunk.append(dumps(serialize(row)) + '\n')
+            else:
+                chunk.append(('' if first else ',') + dumps(serialize(row)))
+                first = False
+            if len(chunk) >= batch_size:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        if fmt != 'ndjson':
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def stream_query(query, id_column, serialize, fmt, batch_size=None):
+    # Reads batch_size rows at a time in id order (see batches_by_id), so
+    # worker memory stays flat for any size. The queries only run once the
+    # response body is iterated; stream_with_context keeps the request alive
+    # until then and the teardown hook removes the session afterwards.
+    batch_size = batch_size or settings.STREAM_BATCH_SIZE
+    rows = (row for batch in batches_by_id(query, id_column, batch_size) for row in batch)
+    return stream_rows(rows, serialize, fmt, batch_size)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+CONTENT_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+CHUNK_SIZE = 64 * 1024
+
+def is_content_hash(value):
+    return isinstance(value, str) and CONTENT_HASH_RE.match(value) is not None
+
+def content_name(content_hash):
+    # Blobs are named after the sha256 of their bytes, so a name always maps
+    # to the same content and the URL can be cached forever.
+    return f"images/{content_hash}"
+
+class UploadQueueFull(Exception):
+    pass
+
+class UploadManager:
+    """Spools uploads to local disk and sends them to storage in the background.
+
+    The request only pays for writing the file to the spool directory. A
+    bounded thread pool does the transfer with retries, and the status of
+    each upload is kept as a small JSON file next to the spooled data so any
+    worker process on the host can answer a status poll. Status files are
+    swept status_ttl seconds after their last change.
+    """
+
+    def __init__(self, workers=Config.UPLOAD_WORKERS, max_pending=Config.UPLOAD_MAX_PENDING,
+                 retries=Config.UPLOAD_RETRIES, spool_dir=Config.UPLOAD_SPOOL_DIR, backoff=0.5,
+                 status_ttl=Config.UPLOAD_STATUS_TTL):
+        self.retries = retries
+        self.spool_dir = spool_dir
+        self.backoff = backoff
+        self.status_ttl = status_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='uploader')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._swept_at = 0
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def submit(self, storage, file):
+        if not self._slots.acquire(blocking=False):
+            raise UploadQueueFull("Too many uploads in progress")
+
+        try:
+            upload_id = uuid.uuid4().hex
+            path = self._path(upload_id, 'data')
+            content_hash = self._spool(file, path)
+            name = content_name(content_hash)
+            self._write_status(upload_id, {"status": "pending", "hash": content_hash})
+            # Lets the hash be used before the transfer finishes, see is_pending
+            self._write_marker(content_hash, upload_id)
+            self._executor.submit(self._transfer, storage, upload_id, path, name, content_hash, file.mimetype)
+        except Exception:
+            self._slots.release()
+            raise
+        self.expire_statuses()
+        return upload_id, content_hash, storage.public_url(name)
+
+    def is_pending(self, content_hash):
+        """Whether an upload of these bytes is still on its way to storage."""
+        if not is_content_hash(content_hash):
+            return False
+        return any(name.startswith(f"{content_hash}.") and name.endswith('.pending')
+                   for name in os.listdir(self.spool_dir))
+
+    def expire_statuses(self, now=None):
+        """Remove spool files untouched for status_ttl seconds.
+
+        Finished and failed uploads only leave their status behind; an upload
+        that a dead worker never finished also leaves its data and marker.
+        Runs at most once a minute.
+        """
+        now = time.time() if now is None else now
+        if now - self._swept_at < min(60, self.status_ttl):
+            return
+        self._swept_at = now
+        for entry in os.scandir(self.spool_dir):
+            try:
+                if now - entry.stat().st_mtime > self.status_ttl:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Swept by another worker
+
+    def status(self, upload_id):
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+        try:
+            with open(self._path(upload_id, 'json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _spool(self, file, path):
+        # Hash while writing so the bytes are only read once
+        digest = hashlib.sha256()
+        with open(path, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        return digest.hexdigest()
+
+    def _transfer(self, storage, upload_id, path, name, content_hash, content_type):
+        try:
+            self._write_status(upload_id, {"status": "uploading", "hash": content_hash})
+            error = None
+            for attempt in range(self.retries):
+                try:
+                    if storage.exists(name):
+                        # Same bytes were uploaded before, nothing to transfer
+                        url = storage.public_url(name)
+                        print(f"File already stored at {url}")
+                    else:
+                        url = storage.upload(path, name, content_type)
+                        print(f"File uploaded to {url}")
+                    self._write_status(upload_id, {"status": "done", "hash": content_hash, "url": url})
+                    return
+                except Exception as e:
+                    print(f"Upload {upload_id} attempt {attempt + 1} failed: {e}")
+                    error = str(e)
+                    if attempt + 1 < self.retries:
+                        time.sleep(self.backoff * 2 ** attempt)
+            self._write_status(upload_id, {"status": "failed", "hash": content_hash, "error": error})
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            self._remove_marker(content_hash, upload_id)
+            self._slots.release()
+
+    def _path(self, upload_id, extension):
+        return os.path.join(self.spool_dir, f"{upload_id}.{extension}")
+
+    def _write_marker(self, content_hash, upload_id):
+        # One marker per upload, so two uploads of the same bytes don't clear
+        # each other's
+        open(os.path.join(self.spool_dir, f"{content_hash}.{upload_id}.pending"), 'w').close()
+
+    def _remove_marker(self, content_hash, upload_id):
+        try:
+            os.remove(os.path.join(self.spool_dir, f"{content_hash}.{upload_id}.pending"))
+        except FileNotFoundError:
+            pass
+
+    def _write_status(self, upload_id, status):
+        path = self._path(upload_id, 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
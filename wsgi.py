@@ -0,0 +1,11 @@
+"""Production entry point.
+
+    gunicorn wsgi:app
+
+Worker count, threads and the bind address come from gunicorn.conf.py,
+which reads them from the config. Each forked worker builds its own
+database pool (see connectors.mysql_connector.after_fork).
+"""
+from index import create_app
+
+app = create_app()